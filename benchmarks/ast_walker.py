@@ -0,0 +1,73 @@
+# Copyright (c) 2016-2017 Chris Fournier. All rights reserved.
+# Use of this source code is governed by a MIT-style license that can be found
+# in the LICENSE file.
+"""
+Microbenchmark of the statement walker in `important.parse` against the
+recursive generator that it replaced; run using:
+
+    python benchmarks/ast_walker.py
+"""
+from __future__ import print_function, unicode_literals
+
+import ast
+import timeit
+
+from important.parse import _ast_imports
+
+
+def recursive_ast_imports(root):
+    for node in ast.iter_child_nodes(root):
+        if isinstance(node, ast.ImportFrom):
+            yield (node.module, node.lineno, node.col_offset)
+        elif isinstance(node, ast.Import):
+            for name in node.names:
+                yield (name.name, node.lineno, node.col_offset)
+        else:
+            for statement in recursive_ast_imports(node):
+                yield statement
+
+
+def generate_source(functions=200, statements=20):
+    # Generate a module resembling generated code: many functions containing
+    # nested control flow, calls and literals, with a few imports
+    lines = ['import os', 'from collections import OrderedDict']
+    for function in range(functions):
+        lines.append('def function_%d(a, b=None):' % function)
+        lines.append('    import json')
+        for statement in range(statements):
+            lines.append('    if a > %d:' % statement)
+            lines.append('        b = OrderedDict([(%s)])' % ', '.join(
+                "('k%d', [%d, {'v': (a, b)}])" % (i, i) for i in range(5)))
+            lines.append('    else:')
+            lines.append('        b = os.path.join(str(a), *[str(b)] * 3)')
+        lines.append('    return b')
+    return '\n'.join(lines)
+
+
+def benchmark(walker, root, number=20, repeat=5):
+    return min(timeit.repeat(lambda: list(walker(root)), number=number,
+                             repeat=repeat)) / number
+
+
+def main():
+    root = ast.parse(generate_source())
+    assert list(_ast_imports(root)) == list(recursive_ast_imports(root))
+    recursive = benchmark(recursive_ast_imports, root)
+    iterative = benchmark(_ast_imports, root)
+    print('recursive walker: {:.2f}ms'.format(recursive * 1000))
+    print('statement walker: {:.2f}ms'.format(iterative * 1000))
+    print('speedup:          {:.1f}x'.format(recursive / iterative))
+
+    # Long generated expressions nest deeper than the recursion limit allows
+    root = ast.parse('import os\nx = ' + ' + '.join(['1'] * 2000))
+    try:
+        list(recursive_ast_imports(root))
+        print('recursive walker: handled deeply nested expression')
+    except RuntimeError:  # RecursionError since Python 3.5
+        print('recursive walker: exceeded recursion limit')
+    assert list(_ast_imports(root)) == [('os', 1, 0)]
+    print('statement walker: handled deeply nested expression')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# Copyright (c) 2016-2017 Chris Fournier. All rights reserved.
+# Use of this source code is governed by a MIT-style license that can be found
+# in the LICENSE file.
+"""
+Measure the memory used to hold the imports of a directory (by default, a
+generated tree of many files importing from a common set of modules) as a
+list of Import records and as an ImportStore, failing unless the store uses
+less than a fraction of the memory; run using:
+
+    python benchmarks/memory.py [directory] [minimum reduction]
+"""
+from __future__ import print_function, unicode_literals
+
+import gc
+import shutil
+import sys
+import tempfile
+import tracemalloc
+
+from important.parse import parse_dir_imports
+from important.store import ImportStore
+
+import synthetic
+
+REDUCTION = 4.0
+FILES = 2000
+IMPORTS = 200  # per file
+MODULES = ['package{:d}.module{:d}'.format(index % 20, index)
+           for index in range(2000)]
+
+
+def allocated(factory):
+    # Bytes still allocated by the value made by `factory` once it returns
+    gc.collect()
+    tracemalloc.start()
+    try:
+        value = factory()
+        gc.collect()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return value, size
+
+
+def main():
+    reduction = float(sys.argv[2]) if len(sys.argv) > 2 else REDUCTION
+    if len(sys.argv) > 1:
+        measure(sys.argv[1], reduction)
+        return
+    directory = tempfile.mkdtemp()
+    try:
+        synthetic.generate_tree(directory, FILES, IMPORTS, scripts=0,
+                                binaries=0, excluded=0, modules=MODULES)
+        measure(directory, reduction)
+    finally:
+        shutil.rmtree(directory)
+
+
+def measure(directory, reduction):
+    imports, listed = allocated(
+        lambda: list(parse_dir_imports(directory, parser='fast')))
+    del imports
+    store, stored = allocated(
+        lambda: ImportStore(parse_dir_imports(directory, parser='fast')))
+    print('imports:     {:d}'.format(len(store)))
+    print('list:        {:.1f}MB'.format(listed / 1024.0 / 1024))
+    print('ImportStore: {:.1f}MB ({:.1f}x less, minimum {:.1f}x)'.format(
+        stored / 1024.0 / 1024, float(listed) / stored, reduction))
+    if listed < stored * reduction:
+        print('ImportStore did not reduce memory enough')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+# Copyright (c) 2016-2017 Chris Fournier. All rights reserved.
+# Use of this source code is governed by a MIT-style license that can be found
+# in the LICENSE file.
+"""
+Measure the time taken by `important --help`, which does no work beyond
+starting up, against a budget; run using:
+
+    python benchmarks/startup.py [budget in milliseconds]
+"""
+from __future__ import print_function, unicode_literals
+
+import os
+import subprocess
+import sys
+import timeit
+
+BUDGET = 250  # milliseconds
+REPEAT = 10
+
+
+def run(*args):
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call((sys.executable,) + args, stdout=devnull)
+
+
+def benchmark(*args):
+    return min(timeit.repeat(lambda: run(*args), number=1, repeat=REPEAT))
+
+
+def main():
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else BUDGET
+    interpreter = benchmark('-c', 'pass') * 1000
+    startup = benchmark('-m', 'important', '--help') * 1000
+    print('interpreter:      {:.0f}ms'.format(interpreter))
+    print('important --help: {:.0f}ms (budget {:.0f}ms)'.format(
+        startup, budget))
+    if startup > budget:
+        print('important --help exceeded its startup budget')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
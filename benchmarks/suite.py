@@ -0,0 +1,199 @@
+# Copyright (c) 2016-2017 Chris Fournier. All rights reserved.
+# Use of this source code is governed by a MIT-style license that can be found
+# in the LICENSE file.
+"""
+Measure the throughput of walking, parsing, resolving requirements to
+modules and checking imports over a synthetic source tree (or a given
+directory), optionally saving the results as a baseline or comparing them
+against one; run using:
+
+    python benchmarks/suite.py [--files N] [--save FILE] [--compare FILE]
+"""
+from __future__ import division, print_function, unicode_literals
+
+import argparse
+import io
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+from important import parse
+from important.check import check_import_frequencies, \
+    check_unused_requirements, ImportSummary
+from important.parse import _walk_files, distribution_module_index, \
+    parse_files_imports, parse_requirements, translate_req_to_module_names, \
+    Exclusions
+
+import synthetic
+
+REPEAT = 3
+TOLERANCE = 0.2
+RE_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def best_time(function, repeat):
+    # Return the result of the fastest of `repeat` calls and its duration
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        result = function()
+        duration = time.time() - start
+        if best is None or duration < best[1]:
+            best = (result, duration)
+    return best
+
+
+def throughput(duration, **counts):
+    return dict(('{}/sec'.format(unit), count / max(duration, 1e-9))
+                for unit, count in counts.items())
+
+
+def write_requirements(directory, requirements):
+    # Write files requiring, and constraining the use of, each requirement
+    requirements_path = os.path.join(directory, 'requirements.txt')
+    constraints_path = os.path.join(directory, 'constraints.txt')
+    with io.open(requirements_path, 'w', encoding='utf8') as fh:
+        fh.write(''.join('{}\n'.format(name) for name in requirements))
+    with io.open(constraints_path, 'w', encoding='utf8') as fh:
+        fh.write(''.join('{}<=1\n'.format(name) for name in requirements))
+    return requirements_path, constraints_path
+
+
+def resolve(requirements_path):
+    # Read and translate requirements as a fresh process would, before the
+    # installed distributions are indexed
+    parse._DISTRIBUTION_MODULE_INDEX = None
+    parse._ALL_MODULES = None
+    requirements = list(parse_requirements(requirements_path))
+    for requirement in requirements:
+        translate_req_to_module_names(requirement.name)
+    return requirements
+
+
+def check(imports, requirements, constraints):
+    summary = ImportSummary(imports)
+    check_unused_requirements(summary, requirements)
+    check_import_frequencies(summary, constraints)
+    return summary
+
+
+def run(directory, exclusions, requirements_path, constraints_path, repeat):
+    directory = os.path.realpath(directory)
+    exclusions = Exclusions(exclusions)
+    results = {}
+
+    filepaths, duration = best_time(
+        lambda: list(_walk_files(directory, exclusions)), repeat)
+    results['walk'] = throughput(duration, files=len(filepaths))
+
+    imports = None
+    for parser in ('ast', 'fast'):
+        imports, duration = best_time(
+            lambda: list(parse_files_imports(filepaths, directory,
+                                             parser=parser)), repeat)
+        results['parse ({})'.format(parser)] = throughput(
+            duration, files=len(filepaths), imports=len(imports))
+
+    requirements, duration = best_time(
+        lambda: resolve(requirements_path), repeat)
+    results['resolve'] = throughput(duration, requirements=len(requirements))
+
+    constraints = list(parse_requirements(constraints_path))
+    _, duration = best_time(
+        lambda: check(imports, requirements, constraints), repeat)
+    results['check'] = throughput(duration, imports=len(imports))
+    return results
+
+
+def report(results, baseline=None, tolerance=TOLERANCE):
+    # Print results, alongside their change from a baseline if given, and
+    # return the number of results that regressed beyond the tolerance
+    regressions = 0
+    for phase in sorted(results):
+        for unit in sorted(results[phase]):
+            value = results[phase][unit]
+            line = '{:<12} {:>14,.0f} {:<16}'.format(phase, value, unit)
+            previous = (baseline or {}).get(phase, {}).get(unit)
+            if previous:
+                change = value / previous - 1
+                line += ' {:+.1%} vs. baseline'.format(change)
+                if change < -tolerance:
+                    line += ' (regressed)'
+                    regressions += 1
+            print(line.rstrip())
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark important over a synthetic source tree')
+    parser.add_argument('--directory',
+                        help='benchmark an existing directory instead')
+    parser.add_argument('--exclude', action='append', default=[],
+                        help='exclusions within --directory')
+    parser.add_argument('--files', type=int, default=2000)
+    parser.add_argument('--imports', type=int, default=20,
+                        help='imports per file')
+    parser.add_argument('--depth', type=int, default=3,
+                        help='maximum nesting depth of directories')
+    parser.add_argument('--scripts', type=float, default=0.05,
+                        help='share of files that are extensionless scripts')
+    parser.add_argument('--binaries', type=float, default=0.05,
+                        help='share of files that are executable binaries')
+    parser.add_argument('--excluded', type=float, default=0.1,
+                        help='share of directories that are excluded')
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--save', metavar='FILE',
+                        help='save the results as a baseline')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='compare the results against a baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='slowdown relative to the baseline allowed')
+    args = parser.parse_args()
+
+    # Import the modules of installed distributions, so that requirements
+    # of them are resolved and used
+    index = distribution_module_index()
+    requirements = sorted(name for name, modules in index.items() if modules)
+    modules = synthetic.MODULES + sorted(
+        set(module for name in requirements for module in index[name]
+            if RE_IDENTIFIER.match(module)))
+
+    temp_directory = tempfile.mkdtemp()
+    try:
+        requirements_path, constraints_path = write_requirements(
+            temp_directory, requirements)
+        if args.directory:
+            directory = args.directory
+            exclusions = args.exclude
+        else:
+            directory = os.path.join(temp_directory, 'tree')
+            exclusions = synthetic.EXCLUSIONS
+            synthetic.generate_tree(
+                directory, args.files, args.imports, args.depth,
+                args.scripts, args.binaries, args.excluded, modules)
+        results = run(directory, exclusions, requirements_path,
+                      constraints_path, args.repeat)
+    finally:
+        shutil.rmtree(temp_directory)
+
+    baseline = None
+    if args.compare:
+        with io.open(args.compare, encoding='utf8') as fh:
+            baseline = json.load(fh)
+    regressions = report(results, baseline, args.tolerance)
+    if args.save:
+        with io.open(args.save, 'w', encoding='utf8') as fh:
+            fh.write(json.dumps(results, indent=2, sort_keys=True))
+    if regressions:
+        print('{:d} results regressed by more than {:.0%}'.format(
+            regressions, args.tolerance))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
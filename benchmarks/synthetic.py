@@ -0,0 +1,126 @@
+# Copyright (c) 2016-2017 Chris Fournier. All rights reserved.
+# Use of this source code is governed by a MIT-style license that can be found
+# in the LICENSE file.
+"""
+Generate a synthetic source tree of a configurable size, e.g. to benchmark
+against a monorepo; run using:
+
+    python benchmarks/synthetic.py DIRECTORY [--files N] [--imports N] ...
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+import os
+import random
+import stat
+
+# Directories generated with this name are excluded using EXCLUSIONS
+EXCLUDED_NAME = 'build'
+EXCLUSIONS = ['**/' + EXCLUDED_NAME]
+FILES_PER_DIRECTORY = 20
+MODULES = ['os', 'os.path', 'sys', 'json', 're', 'collections', 'logging']
+SCRIPT_MODE = stat.S_IRWXU | stat.S_IRGRP | stat.S_IXGRP | stat.S_IROTH | \
+    stat.S_IXOTH
+
+
+def _directories(generator, count, depth, excluded):
+    # Return '/' separated paths of directories nested up to `depth` deep,
+    # a share of which are excluded
+    directories = ['']
+    parents = [''] if depth > 0 else []
+    seen = set(directories)
+    for index in range(count if parents else 0):
+        parent = generator.choice(parents)
+        name = EXCLUDED_NAME if generator.random() < excluded \
+            else 'package{:d}'.format(index)
+        directory = parent + '/' + name if parent else name
+        if directory in seen:
+            continue
+        seen.add(directory)
+        directories.append(directory)
+        if name != EXCLUDED_NAME and directory.count('/') + 1 < depth:
+            parents.append(directory)
+    return directories
+
+
+def _source(generator, modules, imports):
+    lines = ['"""Generated module."""']
+    for _ in range(imports):
+        module = generator.choice(modules)
+        if '.' in module and generator.random() < 0.5:
+            package, _, name = module.rpartition('.')
+            lines.append('from {} import {}'.format(package, name))
+        else:
+            lines.append('import {}'.format(module))
+    lines.extend(['', '', 'def main():', '    return 0', ''])
+    return '\n'.join(lines)
+
+
+def generate_tree(directory, files=1000, imports=20, depth=3, scripts=0.05,
+                  binaries=0.05, excluded=0.1, modules=MODULES, seed=0):
+    """
+    Generate `files` files within `directory`, nested up to `depth`
+    directories deep, of which shares are Python scripts without an
+    extension, executable binaries (which are not parsed) or within
+    excluded directories, and the rest are modules; each script or module
+    has `imports` imports of the given modules.
+    """
+    generator = random.Random(seed)
+    directories = _directories(
+        generator, max(files // FILES_PER_DIRECTORY, 1) - 1, depth, excluded)
+    for relative_directory in directories:
+        path = os.path.join(directory, *relative_directory.split('/'))
+        if not os.path.isdir(path):
+            os.makedirs(path)
+    for index in range(files):
+        relative_directory = generator.choice(directories)
+        path = os.path.join(directory, *relative_directory.split('/'))
+        kind = generator.random()
+        if kind < scripts:
+            filepath = os.path.join(path, 'script{:d}'.format(index))
+            content = '#!/usr/bin/env python\n' + \
+                _source(generator, modules, imports)
+            mode = SCRIPT_MODE
+        elif kind < scripts + binaries:
+            filepath = os.path.join(path, 'binary{:d}'.format(index))
+            content = None
+            mode = SCRIPT_MODE
+        else:
+            filepath = os.path.join(path, 'module{:d}.py'.format(index))
+            content = _source(generator, modules, imports)
+            mode = None
+        with open(filepath, 'wb') as fh:
+            if content is None:
+                fh.write(b'\x7fELF' + bytearray(
+                    generator.randrange(256) for _ in range(1024)))
+            else:
+                fh.write(content.encode('utf8'))
+        if mode is not None:
+            os.chmod(filepath, mode)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Generate a synthetic source tree')
+    parser.add_argument('directory')
+    parser.add_argument('--files', type=int, default=1000)
+    parser.add_argument('--imports', type=int, default=20,
+                        help='imports per file')
+    parser.add_argument('--depth', type=int, default=3,
+                        help='maximum nesting depth of directories')
+    parser.add_argument('--scripts', type=float, default=0.05,
+                        help='share of files that are extensionless scripts')
+    parser.add_argument('--binaries', type=float, default=0.05,
+                        help='share of files that are executable binaries')
+    parser.add_argument('--excluded', type=float, default=0.1,
+                        help='share of directories that are excluded')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    generate_tree(args.directory, args.files, args.imports, args.depth,
+                  args.scripts, args.binaries, args.excluded, seed=args.seed)
+    print('Generated {:d} files in {}; exclude {}'.format(
+        args.files, args.directory, ' '.join(EXCLUSIONS)))
+
+
+if __name__ == '__main__':
+    main()
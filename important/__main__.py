@@ -3,41 +3,493 @@
 # in the LICENSE file.
 import logging
 import os
+import signal
 import sys
+import time
 
 from configparser import ConfigParser
+from functools import partial
 
 import click
 
+from important import __version__
+from important.archive import is_archive, parse_archive_imports
+from important.cache import ImportCache
+from important.git import parse_dir_imports_since, parse_git_files_imports
+from important.index import ImportIndex
+from important.instrument import Profile, report_lines, write_report
+from important.projects import attribute_imports, discover_projects, Project
+from important.daemon import available as daemon_available, \
+    default_socket_path, query, serve
 from important.parse import parse_dir_imports, parse_file_imports, \
-    parse_requirements
-from important.check import check_unused_requirements, check_import_frequencies
+    parse_files_imports, parse_requirements, distribution_module_index, \
+    module_prefilter, refresh_distribution_module_index, Exclusions, \
+    RE_GLOB, SLOWEST_FILES, STATISTICS
+from important.check import check_unused_requirements, \
+    check_import_frequencies, requirement_modules, FailFast, ImportSummary
+from important.watch import watch as watch_changes
 
 
 logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
 
 
+# Number of lines of detailed output echoed at once
+ECHO_CHUNK_SIZE = 1024
+
 CONTEXT_SETTINGS = {
     'help_option_names': ['-h', '--help'],
 }
 
 
-# If a setup file exists, override cli arguments with those values
-if os.path.exists('setup.cfg'):
-    CONFIG = ConfigParser()
-    CONFIG.read('setup.cfg')
+def _read_config(filename='setup.cfg'):
+    # If a setup file exists, override cli arguments with its values
+    if not os.path.exists(filename):
+        return None
+    config = ConfigParser()
+    config.read(filename)
+    if not config.has_section('important'):
+        return None
 
     def split(key_value):
-        if key_value[0] in ('sourcecode',):
+        if key_value[0] in ('sourcecode', 'jobs', 'cache_dir', 'parser',
+                            'since', 'watch', 'daemon', 'socket', 'profile',
+                            'profile_json', 'projects', 'read_threads',
+                            'fail_fast', 'targeted', 'git_files',
+                            'git_untracked'):
             return key_value
+        elif key_value[0] == 'scoped_constraints':
+            # Pairs of a directory and a constraints file
+            values = key_value[1].split()
+            return key_value[0], list(zip(values[::2], values[1::2]))
         else:
             return key_value[0], key_value[1].split()
 
-    CONTEXT_SETTINGS['default_map'] = \
-        dict(map(split, CONFIG.items('important')))
+    return dict(map(split, config.items('important')))
+
+
+class ConfigCommand(click.Command):
+    """
+    Command whose defaults are read from `setup.cfg` when invoked rather than
+    when imported.
+    """
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        if 'default_map' not in extra:
+            default_map = _read_config()
+            if default_map is not None:
+                extra['default_map'] = default_map
+        return super(ConfigCommand, self).make_context(info_name, args,
+                                                       parent, **extra)
+
+
+def _read_requirements(requirements, constraints, ignore, ignorefile,
+                       scoped_constraints=()):
+    # Parse requirements and contraints, including those constraining the
+    # imports within a scope (a directory relative to SOURCECODE)
+    parsed_requirements = []
+    for requirements_path in requirements:
+        parsed_requirements.extend(parse_requirements(requirements_path))
+    parsed_contraints = []
+    for contraints_path in constraints:
+        parsed_contraints.extend(parse_requirements(contraints_path))
+    parsed_scoped_contraints = []
+    for scope, contraints_path in scoped_constraints:
+        parsed_scoped_contraints.append(
+            (scope, list(parse_requirements(contraints_path))))
+
+    # Remove requirements that are ignored
+    ignore = list(ignore)
+    for ignorefile_path in ignorefile:
+        ignore.extend(
+            (r.name for r in parse_requirements(ignorefile_path))
+        )
+    if ignore:
+        parsed_requirements = [r for r in parsed_requirements
+                               if r.name not in ignore]
+
+    return parsed_requirements, parsed_contraints, parsed_scoped_contraints
+
+
+def _scopes(parsed_scoped_contraints):
+    return [scope for scope, _ in parsed_scoped_contraints]
+
+
+def _check_imports(imports, parsed_requirements, parsed_contraints,
+                   parsed_scoped_contraints=()):
+    output = []
+
+    # Test requirements
+    unused_requirements = None
+    if parsed_requirements:
+        unused_requirements = check_unused_requirements(imports,
+                                                        parsed_requirements)
+        for unused_requirement in sorted(unused_requirements):
+            output.append('%s (unused requirement)' % unused_requirement)
+
+    # Test contraints
+    contraint_violations = None
+    if parsed_contraints:
+        contraint_violations = check_import_frequencies(imports,
+                                                        parsed_contraints)
+        for module, violation in sorted(
+                contraint_violations.items(),
+                key=lambda module_violation: module_violation[0]
+        ):
+            constraint, frequency = violation
+            output.append('%s%s (constraint violated by %s==%d)' %
+                          (module, constraint, module, frequency))
+    for scope, parsed_scope_contraints in parsed_scoped_contraints:
+        scope_violations = check_import_frequencies(
+            imports, parsed_scope_contraints, scope)
+        for module, violation in sorted(
+                scope_violations.items(),
+                key=lambda module_violation: module_violation[0]
+        ):
+            constraint, frequency = violation
+            output.append('%s%s (constraint violated by %s==%d within %s)' %
+                          (module, constraint, module, frequency, scope))
+        if scope_violations:
+            contraint_violations = contraint_violations or {}
+            contraint_violations.update(
+                ((scope, module), violation)
+                for module, violation in scope_violations.items())
+
+    return unused_requirements, contraint_violations, output
+
+
+def _watch_imports(sourcecode, exclude, jobs, cache, parser, requirements,
+                   constraints, ignore, ignorefile, scoped_constraints,
+                   verbose):
+    # Keep an index of the imports in each file, parsing only those files
+    # that change, and check the index again after every change
+    index = ImportIndex(sourcecode, exclude, cache, parser)
+    requirements_paths = set(requirements) | set(constraints) | \
+        set(ignorefile) | set(path for _, path in scoped_constraints)
+    parsed = None
+    paths = None
+    changes = watch_changes(sourcecode, index.exclusions, requirements_paths)
+    try:
+        while True:
+            start = time.time()
+            if paths is None:
+                index.build(jobs)
+                changed = len(index)
+            else:
+                changed = index.update(paths)
+            if parsed is None or requirements_paths & paths:
+                try:
+                    parsed = _read_requirements(requirements, constraints,
+                                                ignore, ignorefile,
+                                                scoped_constraints)
+                except (IOError, OSError, ValueError) as exc:
+                    click.echo('Error: %s' % exc, err=True)
+                    parsed = None
+                changed = True
+            if changed and parsed is not None:
+                imports = ImportSummary(index.imports(),
+                                        scopes=_scopes(parsed[2]))
+                unused_requirements, contraint_violations, output = \
+                    _check_imports(imports, *parsed)
+                if verbose >= 1:
+                    click.echo(
+                        'Parsed {imports} imports in {files} files'.format(
+                            imports=imports.imports, files=imports.files))
+                if unused_requirements or contraint_violations:
+                    click.echo('Unused requirements or violated constraints '
+                               'found')
+                    for line in output:
+                        click.echo(line)
+                else:
+                    click.echo('No unused requirements or violated '
+                               'constraints found')
+                if verbose >= 1:
+                    click.echo('Checked in {time:.0f}ms'.format(
+                        time=(time.time() - start) * 1000))
+            paths = next(changes)
+    except (KeyboardInterrupt, StopIteration):
+        pass
+    finally:
+        changes.close()
+
+
+def _echo_requirements(parsed_requirements, parsed_contraints,
+                       parsed_scoped_contraints, echo):
+    echo('Read requirements:')
+    for parsed_requirement in sorted(parsed_requirements,
+                                     key=lambda r: r.name):
+        echo(parsed_requirement.name)
+    echo('Read constraints:')
+    for parsed_contraint in sorted(parsed_contraints, key=lambda r: r.name):
+        echo('{constraint}{specifier}'.format(
+            constraint=parsed_contraint.name,
+            specifier=str(parsed_contraint.specifier)))
+    for scope, parsed_scope_contraints in parsed_scoped_contraints:
+        echo('Read constraints within {scope}:'.format(scope=scope))
+        for parsed_contraint in sorted(parsed_scope_contraints,
+                                       key=lambda r: r.name):
+            echo('{constraint}{specifier}'.format(
+                constraint=parsed_contraint.name,
+                specifier=str(parsed_contraint.specifier)))
+
+
+def _echo_lines(lines, echo):
+    # Echo lines in chunks as echoing each line is slow
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= ECHO_CHUNK_SIZE:
+            echo('\n'.join(chunk))
+            chunk = []
+    if chunk:
+        echo('\n'.join(chunk))
+
+
+def _report(imports, parsed_requirements, parsed_contraints,
+            parsed_scoped_contraints, since, verbose, echo):
+    # Check a summary of imports, echoing statistics, and return a message
+    # describing any unused requirements or violated constraints found (or
+    # otherwise None)
+    unused_requirements, contraint_violations, output = _check_imports(
+        imports, parsed_requirements, parsed_contraints,
+        parsed_scoped_contraints)
+
+    # Statistics
+    if verbose >= 1:
+        echo('Parsed {imports} imports in {files} files'.format(
+            imports=imports.imports,
+            files=imports.files,
+        ))
+    if verbose >= 2 and since:
+        echo('Reused imports of {files} files unchanged since the '
+             'baseline'.format(files=STATISTICS['unchanged_since_baseline']))
+    if verbose >= 2 and STATISTICS['skipped_no_imports']:
+        echo('Skipped {files} files without import statements'.format(
+            files=STATISTICS['skipped_no_imports'],
+        ))
+    if verbose >= 2 and STATISTICS['skipped_prefilter']:
+        echo('Skipped {files} files not naming any module checked'.format(
+            files=STATISTICS['skipped_prefilter'],
+        ))
+    if verbose >= 3:
+        _echo_lines((filename for filename, in imports.filenames), echo)
+        _echo_lines(('{module}={filename}:{lineno}'.format(
+            module=module,
+            filename=filename,
+            lineno=lineno) for module, filename, lineno, _ in
+            imports.statements), echo)
+        imports.close()
+
+    if unused_requirements or contraint_violations:
+        message = 'Unused requirements or violated constraints found'
+        message += '\n' if output else ''
+        message += '\n'.join(output) if output else ''
+        return message
+    return None
+
+
+def _exit(message, verbose):
+    if message is not None:
+        if verbose >= 1:
+            raise click.ClickException(message)
+        else:
+            sys.exit(1)
+
+
+def _check_projects(sourcecode, exclude, jobs, cache, parser, read_threads,
+                    requirements, constraints, ignore, ignorefile, verbose,
+                    profiler):
+    # Walk and parse SOURCECODE once, attributing imports to the projects
+    # within it, then check each project's imports; return a message
+    # describing any unused requirements or violated constraints found and
+    # the summary of each project's imports
+    with profiler.phase('scan'):
+        projects, filepaths = discover_projects(sourcecode, exclude)
+    if requirements or constraints:
+        # Requirements given configure SOURCECODE as a project in place of
+        # its own setup.cfg (from which they are read if it is in the cwd)
+        projects = [Project(os.curdir, sourcecode, sourcecode, exclude,
+                            requirements, constraints, ignore, ignorefile)] + \
+            [project for project in projects
+             if project.directory != sourcecode]
+    if not projects:
+        raise click.BadParameter("no projects found within SOURCECODE '%s'; "
+                                 "configure projects using [important] "
+                                 "sections of setup.cfg files" % sourcecode,
+                                 param_hint='--projects')
+
+    parsed = {}
+    with profiler.phase('requirements'):
+        for project in projects:
+            try:
+                parsed[project.name] = _read_requirements(
+                    project.requirements, project.constraints, project.ignore,
+                    project.ignorefile)
+            except (IOError, OSError, ValueError) as exc:
+                raise click.ClickException('%s: %s' % (project.name, exc))
+    if verbose >= 2:
+        for project in projects:
+            _echo_requirements(*parsed[project.name], echo=partial(
+                _echo_project, project.name))
+
+    summaries = dict((project.name, ImportSummary(detailed=verbose >= 3))
+                     for project in projects)
+    with profiler.phase('scan'):
+        for project, import_statement in attribute_imports(
+                parse_files_imports(filepaths, sourcecode, jobs, cache,
+                                    parser, read_threads),
+                sourcecode, projects):
+            summaries[project.name].add(import_statement)
+        if cache is not None:
+            cache.evict()
+
+    with profiler.phase('resolve'):
+        distribution_module_index()
+    output = []
+    with profiler.phase('check'):
+        for project in projects:
+            message = _report(summaries[project.name], *parsed[project.name],
+                              since=None, verbose=verbose,
+                              echo=partial(_echo_project, project.name))
+            if message is not None:
+                output.extend('%s: %s' % (project.name, line)
+                              for line in message.split('\n')[1:])
+    message = None
+    if output:
+        message = '\n'.join(
+            ['Unused requirements or violated constraints found'] + output)
+    return message, [summaries[project.name] for project in projects]
+
+
+def _scoped_constraints(scoped_constraints, sourcecode, projects):
+    # Scopes are directories relative to SOURCECODE, in which imports are
+    # named relative to it
+    if not scoped_constraints:
+        return []
+    if projects or not os.path.isdir(sourcecode) or is_archive(sourcecode):
+        raise click.BadParameter('imports can only be constrained within '
+                                 'the directories of SOURCECODE (a '
+                                 'directory) when not checking projects',
+                                 param_hint='--scoped-constraints')
+    scopes = []
+    for directory, constraints_path in scoped_constraints:
+        scope = os.path.relpath(directory, sourcecode)
+        if scope == os.pardir or scope.startswith(os.pardir + os.sep):
+            raise click.BadParameter("directory '%s' is not within "
+                                     "SOURCECODE" % directory,
+                                     param_hint='--scoped-constraints')
+        scopes.append((scope.replace(os.sep, '/'), constraints_path))
+    return scopes
+
+
+def _prefilter(parsed_requirements, parsed_contraints,
+               parsed_scoped_contraints):
+    # Search for the modules of every requirement and constraint checked
+    modules = requirement_modules(parsed_requirements) | \
+        requirement_modules(parsed_contraints)
+    for _, parsed_scope_contraints in parsed_scoped_contraints:
+        modules |= requirement_modules(parsed_scope_contraints)
+    return module_prefilter(modules)
+
+
+def _summarise(imports, statements, fail_fast):
+    # Summarise imports as they are parsed, unless failing fast, in which
+    # case stop parsing (and walking) once the outcome is decided
+    if fail_fast is None:
+        imports.update(statements)
+        return
+    statements = iter(statements)
+    try:
+        if fail_fast.decided:
+            return
+        for statement in statements:
+            if fail_fast.add(statement):
+                break
+    finally:
+        if hasattr(statements, 'close'):
+            statements.close()
 
 
-@click.command(help="Check imports within SOURCECODE (except those files "
+def _echo_project(name, line):
+    click.echo('%s: %s' % (name, line))
+
+
+def _echo_profile(profiler, summaries, profile, profile_json):
+    report = profiler.report(STATISTICS, SLOWEST_FILES, summaries)
+    if profile:
+        for line in report_lines(report):
+            click.echo(line, err=True)
+    if profile_json:
+        write_report(report, profile_json)
+
+
+def _serve_imports(socket_path, sourcecode, exclude, jobs, parser, verbose):
+    # Keep an index of the imports in each directory checked, and the
+    # requirements files and installed distributions read, in memory
+    indexes = {}
+
+    def index(sourcecode, exclude, parser):
+        key = (sourcecode, tuple(sorted(exclude)), parser)
+        if key in indexes:
+            indexes[key].refresh()
+        else:
+            indexes[key] = ImportIndex(sourcecode, exclude, parser=parser)
+            indexes[key].build(jobs)
+        return indexes[key]
+
+    def handle(request):
+        start = time.time()
+        if request.get('version') != __version__:
+            return {'error': 'version %s of important is running' %
+                    __version__}
+        if request.get('prefix') != sys.prefix:
+            return {'error': 'important is running in %s' % sys.prefix}
+        # Resolve requirements against the distributions now installed
+        refresh_distribution_module_index()
+        lines = []
+        try:
+            parsed = _read_requirements(
+                request['requirements'], request['constraints'],
+                request['ignore'], request['ignorefile'],
+                request['scoped_constraints'])
+            if request['verbose'] >= 2:
+                _echo_requirements(*parsed, echo=lines.append)
+            STATISTICS.clear()
+            imports = ImportSummary(
+                index(request['sourcecode'], request['exclude'],
+                      request['parser']).imports(),
+                detailed=request['verbose'] >= 3, scopes=_scopes(parsed[2]))
+            message = _report(imports, *parsed, since=None,
+                              verbose=request['verbose'], echo=lines.append)
+        except (IOError, OSError, KeyError, TypeError, ValueError) as exc:
+            # Clients check in-process instead, reporting any errors
+            return {'error': str(exc)}
+        if verbose >= 1:
+            click.echo('Checked {sourcecode} in {time:.0f}ms'.format(
+                sourcecode=request['sourcecode'],
+                time=(time.time() - start) * 1000))
+        return {'lines': lines, 'message': message}
+
+    def ready():
+        click.echo('Listening on %s' % socket_path)
+
+    # Index SOURCECODE and installed distributions before listening
+    index(sourcecode, exclude, parser)
+    distribution_module_index()
+    # Remove the socket when terminated
+    try:
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    except ValueError:
+        pass  # Not the main thread
+    try:
+        serve(socket_path, handle, ready)
+    except KeyboardInterrupt:
+        pass
+
+
+@click.command(cls=ConfigCommand,
+               help="Check imports within SOURCECODE (a file, a directory, "
+                    "or a wheel, sdist or other zip or tar archive, which is "
+                    "read without being extracted; except those files "
                     "provided in EXCLUDE) for either unused requirements or "
                     "an import frequency that violates some constraints.",
                context_settings=CONTEXT_SETTINGS)
@@ -67,6 +519,19 @@ if os.path.exists('setup.cfg'):
               type=click.Path(exists=True, file_okay=True, dir_okay=False,
                               writable=False, readable=True,
                               resolve_path=True))
+@click.option('--scoped-constraints', nargs=2, multiple=True,
+              metavar='DIRECTORY FILE',
+              help="Requirement(s) file interpreted as constraints (see "
+                   "--constraints) on the frequency of imports within a "
+                   "DIRECTORY of SOURCECODE (a directory), e.g. "
+                   "`--scoped-constraints services banned.txt`, which may be "
+                   "given for many directories; imports are counted once for "
+                   "all of them",
+              type=(click.Path(exists=True, file_okay=False, dir_okay=True,
+                               resolve_path=True),
+                    click.Path(exists=True, file_okay=True, dir_okay=False,
+                               writable=False, readable=True,
+                               resolve_path=True)))
 @click.option('--ignore', '-i', multiple=True,
               help="Requirement names to ignore when searching for unused "
                    "requirements")
@@ -76,113 +541,285 @@ if os.path.exists('setup.cfg'):
                               writable=False, readable=True,
                               resolve_path=True))
 @click.option('--exclude', '-e', multiple=True,
-              help="Python files or directories to exclude from analysis",
-              type=click.Path(exists=True, file_okay=True, dir_okay=True,
-                              writable=False, readable=True,
-                              resolve_path=True))
+              help="Python files or directories to exclude from analysis, or "
+                   "glob patterns matched against paths relative to "
+                   "SOURCECODE (e.g. `**/test_*.py`, where `**/` matches any "
+                   "number of directories)")
 @click.argument('sourcecode', nargs=1,
                 type=click.Path(exists=True, file_okay=True, dir_okay=True,
                                 writable=False, readable=True,
                                 resolve_path=True))
+@click.option('--jobs', '-j', type=click.IntRange(min=1), default=None,
+              help="Number of processes used to parse source code files "
+                   "(defaults to the number of CPUs); small directories are "
+                   "always parsed serially")
+@click.option('--cache-dir', default=None,
+              help="Directory in which to cache the imports parsed from each "
+                   "file so that unchanged files are not parsed again on "
+                   "subsequent runs (e.g. .important_cache)",
+              type=click.Path(file_okay=False, dir_okay=True,
+                              resolve_path=True))
+@click.option('--parser', default='ast', type=click.Choice(['ast', 'fast']),
+              help="Engine used to find import statements; `fast` scans "
+                   "tokens instead of building a syntax tree, falling back to "
+                   "`ast` for source that it cannot handle, but does not "
+                   "report syntax errors elsewhere in files")
+@click.option('--read-threads', type=click.IntRange(min=1), default=None,
+              help="Number of threads used to read files ahead of parsing "
+                   "them (e.g. 16), so that many reads from a slow or "
+                   "network filesystem are waited on at once; files are then "
+                   "parsed in this process as they are read, rather than by "
+                   "--jobs processes, and cached files are not read ahead")
+@click.option('--since', metavar='REF', default=None,
+              help="Parse only those files changed since the git commit REF "
+                   "(or HEAD) was last checked, reusing the imports then "
+                   "found in all other files; baselines are stored in "
+                   "--cache-dir if given, or otherwise in the git directory")
+@click.option('--git-files', is_flag=True, default=False,
+              help="Parse the files within SOURCECODE (a directory within a "
+                   "git repository) that are tracked by git, listing them "
+                   "from its index rather than walking SOURCECODE, so that "
+                   "untracked directories (e.g. virtualenvs) are never read")
+@click.option('--git-untracked', is_flag=True, default=False,
+              help="With --git-files, also parse the files that are not "
+                   "tracked by git but are not ignored (e.g. by .gitignore)")
+@click.option('--watch', is_flag=True, default=False,
+              help="Keep checking SOURCECODE (a directory) as its files "
+                   "change, parsing only those files that have changed "
+                   "since the last check; stop using Ctrl+C")
+@click.option('--daemon', is_flag=True, default=False,
+              help="Serve checks of SOURCECODE (a directory) from memory, "
+                   "parsing again only those files that have changed since "
+                   "the last check; subsequent checks of SOURCECODE in the "
+                   "same Python environment query the daemon if it is "
+                   "running")
+@click.option('--socket', default=None,
+              help="Unix socket on which the daemon listens (defaults to a "
+                   "socket for SOURCECODE in $XDG_RUNTIME_DIR, or otherwise "
+                   "in a directory of the temporary directory private to "
+                   "the user)",
+              type=click.Path(dir_okay=False, resolve_path=True))
+@click.option('--profile', is_flag=True, default=False,
+              help="Report the time taken by each phase of the check, the "
+                   "files read and skipped, the peak memory allocated by the "
+                   "main process (which slows the check while traced; "
+                   "processes of --jobs are not traced) and the slowest "
+                   "files to parse")
+@click.option('--profile-json', default=None,
+              help="File to which to write the --profile report as JSON",
+              type=click.Path(dir_okay=False, writable=True,
+                              resolve_path=True))
+@click.option('--projects', is_flag=True, default=False,
+              help="Check each project within SOURCECODE (a directory), "
+                   "configured by the [important] section of its setup.cfg, "
+                   "against its own requirements and constraints, walking "
+                   "and parsing SOURCECODE only once; files belong to the "
+                   "innermost project containing them, and any requirements "
+                   "or constraints given configure SOURCECODE as a project")
+@click.option('--fail-fast', '--early-exit', 'fail_fast', is_flag=True,
+              default=False,
+              help="Stop parsing SOURCECODE once the outcome of the check is "
+                   "decided: once every requirement has been imported, if "
+                   "there are no constraints, or once any constraint's upper "
+                   "bound has been exceeded, in which case only the "
+                   "constraints found to be violated (and the frequencies "
+                   "counted so far) are reported")
+@click.option('--targeted', is_flag=True, default=False,
+              help="Parse only those files whose source names a module of "
+                   "the requirements or constraints checked, found by "
+                   "searching each file for all such names at once, as "
+                   "other files cannot affect the outcome (but are not "
+                   "counted as parsed); cached files are parsed in full")
 @click.option('-v', '--verbose', count=True)
-def check(requirements, constraints, ignore, ignorefile, exclude, sourcecode,
-          verbose):
+def check(requirements, constraints, scoped_constraints, ignore, ignorefile,
+          exclude, sourcecode, jobs, cache_dir, parser, read_threads, since,
+          git_files, git_untracked, watch, daemon, socket, profile,
+          profile_json, projects, fail_fast, targeted, verbose):
+    # Exclusions that are not globs are relative to the cwd
+    exclude = [exclusion if RE_GLOB.search(exclusion)
+               else os.path.abspath(exclusion) for exclusion in exclude]
+    scoped_constraints = _scoped_constraints(scoped_constraints, sourcecode,
+                                             projects)
+    profiling = bool(profile or profile_json)
+    if profiling and (daemon or watch):
+        raise click.BadParameter('checks cannot be profiled while watching '
+                                 'or serving', param_hint='--profile')
+    if fail_fast and (daemon or watch or projects):
+        raise click.BadParameter('checks cannot fail fast while watching or '
+                                 'serving, or when checking projects',
+                                 param_hint='--fail-fast')
+    if targeted and (daemon or watch or projects or since):
+        raise click.BadParameter('checks cannot be targeted while watching '
+                                 'or serving, when checking projects or '
+                                 'since a commit', param_hint='--targeted')
+    if git_untracked and not git_files:
+        raise click.BadParameter('untracked files are only parsed with '
+                                 '--git-files', param_hint='--git-untracked')
+    if git_files and (daemon or watch or projects or since or
+                      not os.path.isdir(sourcecode)):
+        raise click.BadParameter('files can only be listed from git for '
+                                 'SOURCECODE (a directory) when not '
+                                 'watching, serving, checking projects or '
+                                 'checking since a commit',
+                                 param_hint='--git-files')
+    if projects and (daemon or watch or since):
+        raise click.BadParameter('projects cannot be checked while watching '
+                                 'or serving, or since a commit',
+                                 param_hint='--projects')
+    profiler = Profile(trace_memory=profiling)
+
+    if daemon:
+        if not daemon_available():
+            raise click.BadParameter('daemons are not supported on this '
+                                     'platform', param_hint='--daemon')
+        if not os.path.isdir(sourcecode):
+            raise click.BadParameter("could not serve SOURCECODE '%s'; path "
+                                     "is not a directory" % sourcecode)
+        # Read any requirements given so that they are cached
+        _read_requirements(requirements, constraints, ignore, ignorefile,
+                           scoped_constraints)
+        try:
+            _serve_imports(socket or default_socket_path(sourcecode),
+                           sourcecode, exclude, jobs, parser, verbose)
+        except ValueError as exc:
+            raise click.BadParameter(str(exc), param_hint='--socket')
+        return
+
+    if projects:
+        if not os.path.isdir(sourcecode):
+            raise click.BadParameter("could not check projects within "
+                                     "SOURCECODE '%s'; path is not a "
+                                     "directory" % sourcecode)
+        STATISTICS.clear()
+        del SLOWEST_FILES[:]
+        message, summaries = _check_projects(
+            sourcecode, Exclusions(exclude), jobs,
+            ImportCache(cache_dir, parser) if cache_dir else None, parser,
+            read_threads, requirements, constraints, ignore, ignorefile,
+            verbose, profiler)
+        if profiling:
+            _echo_profile(profiler, summaries, profile, profile_json)
+        _exit(message, verbose)
+        return
+
     # Validate options
-    if not requirements and not constraints:
+    if not requirements and not constraints and not scoped_constraints:
         raise click.BadParameter('no checks performed; supply either '
                                  '--requirements or --contraints')
 
-    # Parse requirements and contraints
-    parsed_requirements = []
-    for requirements_path in requirements:
-        parsed_requirements.extend(parse_requirements(requirements_path))
-    parsed_contraints = []
-    for contraints_path in constraints:
-        parsed_contraints.extend(parse_requirements(contraints_path))
-
-    # Remove requirements that are ignored
-    ignore = list(ignore)
-    for ignorefile_path in ignorefile:
-        ignore.extend(
-            (r.name for r in parse_requirements(ignorefile_path))
-        )
-    if ignore:
-        parsed_requirements = [r for r in parsed_requirements
-                               if r.name not in ignore]
+    # Query a daemon if one is running, or otherwise check in-process; the
+    # daemon does not honour options of how files are found and parsed
+    if os.path.isdir(sourcecode) and not since and not watch and \
+            not profiling and not git_files and not fail_fast and \
+            not targeted and not cache_dir and not jobs and \
+            not read_threads and daemon_available():
+        try:
+            socket_path = socket or default_socket_path(sourcecode)
+        except ValueError:
+            socket_path = None
+        response = socket_path and query(socket_path, {
+            'version': __version__,
+            'prefix': sys.prefix,
+            'sourcecode': sourcecode,
+            'requirements': requirements,
+            'constraints': constraints,
+            'scoped_constraints': scoped_constraints,
+            'ignore': ignore,
+            'ignorefile': ignorefile,
+            'exclude': exclude,
+            'parser': parser,
+            'verbose': verbose,
+        })
+        if response is not None and 'error' not in response:
+            for line in response['lines']:
+                click.echo(line)
+            _exit(response['message'], verbose)
+            return
 
+    with profiler.phase('requirements'):
+        parsed = _read_requirements(requirements, constraints, ignore,
+                                    ignorefile, scoped_constraints)
     if verbose >= 2:
-        click.echo('Read requirements:')
-        for parsed_requirement in sorted(parsed_requirements,
-                                         key=lambda r: r.name):
-            click.echo(parsed_requirement.name)
-        click.echo('Read constraints:')
-        for parsed_contraint in sorted(parsed_contraints,
-                                       key=lambda r: r.name):
-            click.echo('{constraint}{specifier}'.format(
-                constraint=parsed_contraint.name,
-                specifier=str(parsed_contraint.specifier)))
+        _echo_requirements(*parsed, echo=click.echo)
 
     # Parse source code
-    imports = None
-    if os.path.isfile(sourcecode):
-        imports = set(parse_file_imports(sourcecode, exclude))
-    elif os.path.isdir(sourcecode):
-        imports = set(parse_dir_imports(sourcecode, exclude))
+    imports = ImportSummary(detailed=verbose >= 3, scopes=_scopes(parsed[2]))
+    if fail_fast:
+        # Requirements are resolved before parsing to decide the outcome
+        with profiler.phase('resolve'):
+            fail_fast = FailFast(imports, *parsed)
     else:
-        raise click.BadParameter("could not parse SOURCECODE '%s'; path is "
-                                 "either not a file or not a directory" %
-                                 sourcecode)
-    filenames = set(i.filename for i in imports)
-
-    output = []
-
-    # Test requirements
-    unused_requirements = None
-    if parsed_requirements:
-        unused_requirements = check_unused_requirements(imports,
-                                                        parsed_requirements)
-        if verbose > 0:
-            for unused_requirement in sorted(unused_requirements):
-                output.append('%s (unused requirement)' % unused_requirement)
-
-    # Test contraints
-    contraint_violations = None
-    if constraints:
-        contraint_violations = check_import_frequencies(imports,
-                                                        parsed_contraints)
-        if verbose > 0:
-            for module, violation in sorted(
-                    contraint_violations.items(),
-                    key=lambda module_violation: module_violation[0]
-            ):
-                constraint, frequency = violation
-                output.append('%s%s (constraint violated by %s==%d)' %
-                              (module, constraint, module, frequency))
-
-    # Statistics
-    if verbose >= 1:
-        click.echo('Parsed {imports} imports in {files} files'.format(
-            imports=len(imports),
-            files=len(filenames),
-        ))
-    if verbose >= 3:
-        for filename in sorted(filenames):
-            click.echo(filename)
-        for i in sorted(imports):
-            click.echo('{module}={filename}:{lineno}'.format(
-                module=i.module,
-                filename=i.filename,
-                lineno=i.lineno))
-
-    # Exit
-    if unused_requirements or contraint_violations:
-        if verbose >= 1:
-            message = 'Unused requirements or violated constraints found'
-            message += '\n' if output else ''
-            message += '\n'.join(output) if output else ''
-            raise click.ClickException(message)
+        fail_fast = None
+    prefilter = None
+    if targeted:
+        with profiler.phase('resolve'):
+            prefilter = _prefilter(*parsed)
+    STATISTICS.clear()
+    del SLOWEST_FILES[:]
+    cache = ImportCache(cache_dir, parser) if cache_dir else None
+    exclude = Exclusions(exclude)
+    if watch:
+        if not os.path.isdir(sourcecode):
+            raise click.BadParameter("could not watch SOURCECODE '%s'; path "
+                                     "is not a directory" % sourcecode)
+        _watch_imports(sourcecode, exclude, jobs, cache, parser, requirements,
+                       constraints, ignore, ignorefile, scoped_constraints,
+                       verbose)
+        return
+    with profiler.phase('scan'):
+        if os.path.isfile(sourcecode) and is_archive(sourcecode):
+            try:
+                _summarise(imports, parse_archive_imports(
+                    sourcecode, exclude, parser, prefilter), fail_fast)
+            except ValueError as exc:
+                raise click.BadParameter(str(exc))
+        elif os.path.isfile(sourcecode):
+            _summarise(imports, parse_file_imports(
+                sourcecode, exclude, cache=cache, parser=parser,
+                prefilter=prefilter), fail_fast)
+        elif os.path.isdir(sourcecode) and since:
+            try:
+                _summarise(imports, parse_dir_imports_since(
+                    sourcecode, since, exclude, jobs, cache, parser,
+                    cache_dir, read_threads), fail_fast)
+            except ValueError as exc:
+                raise click.BadParameter(str(exc), param_hint='--since')
+        elif os.path.isdir(sourcecode) and git_files:
+            try:
+                _summarise(imports, parse_git_files_imports(
+                    sourcecode, exclude, jobs, cache, parser, git_untracked,
+                    read_threads, prefilter), fail_fast)
+            except ValueError as exc:
+                raise click.BadParameter(str(exc), param_hint='--git-files')
+        elif os.path.isdir(sourcecode):
+            _summarise(imports, parse_dir_imports(
+                sourcecode, exclude, jobs, cache, parser, read_threads,
+                prefilter), fail_fast)
         else:
-            sys.exit(1)
+            raise click.BadParameter("could not parse SOURCECODE '%s'; path "
+                                     "is either not a file or not a "
+                                     "directory" % sourcecode)
+        if cache is not None:
+            cache.evict()
+
+    with profiler.phase('resolve'):
+        distribution_module_index()
+    if fail_fast is not None and fail_fast.violated:
+        # Only the constraints found to be violated are decided
+        parsed = ([],) + fail_fast.violated_constraints()
+    with profiler.phase('check'):
+        message = _report(imports, *parsed, since=since, verbose=verbose,
+                          echo=click.echo)
+    if verbose >= 1 and fail_fast is not None and fail_fast.decided:
+        click.echo('Stopped once the outcome was decided, skipping '
+                   '{files} files found but not parsed and {directories} '
+                   'directories not walked'.format(
+                       files=max(STATISTICS['files_found'] -
+                                 STATISTICS['files_scanned'], 0),
+                       directories=STATISTICS['directories_not_walked']))
+    if profiling:
+        _echo_profile(profiler, [imports], profile, profile_json)
+    _exit(message, verbose)
 
 
 if __name__ == '__main__':
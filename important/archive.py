@@ -0,0 +1,113 @@
+# Copyright (c) 2016-2017 Chris Fournier. All rights reserved.
+# Use of this source code is governed by a MIT-style license that can be found
+# in the LICENSE file.
+from __future__ import unicode_literals
+
+import os
+
+from functools import partial
+
+from important.parse import _has_python_shebang, _source_imports, \
+    _statements_imports, Exclusions, EXECUTABLE_MODE, STATISTICS
+
+
+# Wheels, eggs and zipapps are zip archives; sdists are (usually) tarballs
+ZIP_EXTENSIONS = ('.whl', '.zip', '.egg', '.pyz')
+TAR_EXTENSIONS = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz',
+                  '.txz')
+
+
+def is_archive(path):
+    return path.lower().endswith(ZIP_EXTENSIONS + TAR_EXTENSIONS)
+
+
+def _member_name(name):
+    # Archives may name members `./a.py` or, on Windows, `a\\b.py`
+    name = name.replace('\\', '/')
+    while name.startswith('./'):
+        name = name[2:]
+    return name.lstrip('/')
+
+
+def _zip_members(archive_path):
+    import zipfile
+    with zipfile.ZipFile(archive_path) as archive:
+        for info in archive.infolist():
+            if not info.filename.endswith('/'):
+                # Unix modes are kept in the high bits of external attributes
+                yield _member_name(info.filename), info.external_attr >> 16, \
+                    partial(archive.read, info)
+
+
+def _tar_members(archive_path):
+    # Stream members in order, so that a compressed tarball is decompressed
+    # once and members cannot be read out of order
+    import tarfile
+    with tarfile.open(archive_path, mode='r|*') as archive:
+        for info in archive:
+            if info.isfile():
+                yield _member_name(info.name), info.mode, \
+                    partial(_read_member, archive, info)
+
+
+def _read_member(archive, info):
+    member = archive.extractfile(info)
+    try:
+        return member.read()
+    finally:
+        member.close()
+
+
+def _member_imports(read, filepath, parser, prefilter):
+    return _source_imports(read(), filepath, parser, prefilter)
+
+
+def _script_source(read):
+    # Read the source of an executable member if it is a Python script
+    source = read()
+    if _has_python_shebang(source):
+        return lambda: source
+    return None
+
+
+def parse_archive_imports(archive_path, exclusions=None, parser='ast',
+                          prefilter=None):
+    """
+    Parse the imports of the Python files and scripts within a zip (e.g. a
+    wheel) or tar (e.g. an sdist) archive, reading each member once from the
+    archive without extracting it; filenames are paths within the archive
+    and exclusions are matched against them as they would be against the
+    paths of files within a directory.  Raises ValueError if the archive
+    cannot be read.
+    """
+    # Import archive modules only when needed as they are slow to import
+    import tarfile
+    import zipfile
+    archive_path = os.path.realpath(archive_path)
+    if not isinstance(exclusions, Exclusions):
+        exclusions = Exclusions(exclusions)
+    if exclusions.excludes(archive_path):
+        STATISTICS['excluded'] += 1
+        return
+    members = _zip_members(archive_path) if zipfile.is_zipfile(archive_path) \
+        else _tar_members(archive_path)
+    try:
+        for name, mode, read in members:
+            if exclusions and \
+                    exclusions.excludes_relative(archive_path, name):
+                STATISTICS['excluded'] += 1
+                continue
+            if not name.endswith('.py'):
+                if not mode & EXECUTABLE_MODE:
+                    continue
+                read = _script_source(read)
+                if read is None:
+                    continue
+            filepath = archive_path + '/' + name
+            for statement in _statements_imports(
+                    partial(_member_imports, read, filepath, parser,
+                            prefilter),
+                    filepath, name):
+                yield statement
+    except (tarfile.TarError, zipfile.BadZipfile, EOFError) as exc:
+        raise ValueError('Cannot read %s: %s' % (archive_path, exc))
@@ -0,0 +1,256 @@
+# Copyright (c) 2016-2017 Chris Fournier. All rights reserved.
+# Use of this source code is governed by a MIT-style license that can be found
+# in the LICENSE file.
+from __future__ import unicode_literals
+
+import errno
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+from important import __version__
+
+
+# Minimum number of seconds between scans of the cache for entries whose
+# source files no longer exist
+EVICT_INTERVAL = 24 * 60 * 60
+# Number of the most recently stored baselines kept
+BASELINES_KEPT = 8
+
+
+def _mtime_ns(file_stat):
+    mtime_ns = getattr(file_stat, 'st_mtime_ns', None)
+    if mtime_ns is None:
+        mtime_ns = int(file_stat.st_mtime * 1e9)
+    return mtime_ns
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return 0
+
+
+def stat_key(file_stat):
+    # Key files by their size and modification time
+    return [file_stat.st_size, _mtime_ns(file_stat)]
+
+
+def _makedirs(directory):
+    try:
+        os.makedirs(directory)
+    except OSError as exc:
+        if exc.errno != errno.EEXIST:
+            raise
+
+
+def _replace(source, destination):
+    if hasattr(os, 'replace'):
+        os.replace(source, destination)
+    else:
+        os.rename(source, destination)
+
+
+def _dump(path, value):
+    # Write JSON atomically so that concurrent readers never see partial files
+    directory = os.path.dirname(path)
+    try:
+        _makedirs(directory)
+        handle, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    except OSError:
+        # Caching is only an optimization, so skip directories that cannot be
+        # written (e.g. read-only or full)
+        return
+    try:
+        with os.fdopen(handle, 'wb') as temp_file:
+            temp_file.write(json.dumps(value).encode('utf8'))
+        _replace(temp_path, path)
+    except (IOError, OSError):
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+
+def _load(path):
+    try:
+        with io.open(path, mode='rt', encoding='utf8') as handle:
+            return json.load(handle)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+class ImportCache(object):
+    """
+    On-disk cache of the import statements found in each source file.
+
+    Entries are stored one per source file and are keyed by the file's path,
+    size and modification time; if the latter change but the file's content
+    hash does not, the entry is reused and rekeyed.  Entries of each `parser`
+    are stored apart, and are written atomically so that a cache directory
+    can be shared by concurrent runs.
+    """
+
+    def __init__(self, directory, parser='ast'):
+        self.directory = directory
+        self.entries_directory = os.path.join(
+            directory, '%s-py%d.%d-%s' % (
+                (__version__,) + sys.version_info[:2] + (parser,)))
+
+    def _entry_path(self, filepath):
+        digest = hashlib.sha1(filepath.encode('utf8')).hexdigest()
+        return os.path.join(self.entries_directory, digest[:2],
+                            digest + '.json')
+
+    def _load(self, entry_path, filepath):
+        entry = _load(entry_path)
+        # Guard against corrupt entries and hash collisions
+        if not isinstance(entry, dict) or entry.get('path') != filepath:
+            return None
+        return entry
+
+    def _store(self, entry_path, entry):
+        _dump(entry_path, entry)
+
+    @staticmethod
+    def _result(entry):
+        if 'error' in entry:
+            msg, filename, lineno, offset, text = entry['error']
+            raise SyntaxError(msg, (filename, lineno, offset, text))
+        return [tuple(statement) for statement in entry['statements']]
+
+    def statements(self, filepath, parse):
+        """
+        Return the (module, lineno, col_offset) statements of `filepath`,
+        calling `parse(source, filepath)` on the file's bytes only if no
+        valid entry is cached.
+        """
+        filepath = os.path.abspath(filepath)
+        entry_path = self._entry_path(filepath)
+        key = stat_key(os.stat(filepath))
+        entry = self._load(entry_path, filepath)
+        if entry is not None and entry.get('key') == key:
+            return self._result(entry)
+        with io.open(filepath, mode='rb') as handle:
+            source = handle.read()
+        digest = hashlib.sha1(source).hexdigest()
+        if entry is not None and entry.get('digest') == digest:
+            entry['key'] = key
+            self._store(entry_path, entry)
+            return self._result(entry)
+        entry = {'path': filepath, 'key': key, 'digest': digest}
+        try:
+            statements = list(parse(source, filepath))
+        except SyntaxError as exc:
+            entry['error'] = [exc.msg, exc.filename, exc.lineno, exc.offset,
+                              exc.text]
+            self._store(entry_path, entry)
+            raise
+        entry['statements'] = statements
+        self._store(entry_path, entry)
+        return statements
+
+    def evict(self, force=False):
+        """
+        Remove entries whose source files no longer exist; unless forced, this
+        is done at most once every EVICT_INTERVAL seconds.
+        """
+        stamp_path = os.path.join(self.entries_directory, '.evicted')
+        if not force:
+            try:
+                if time.time() - os.stat(stamp_path).st_mtime < \
+                        EVICT_INTERVAL:
+                    return 0
+            except OSError:
+                pass
+        try:
+            _makedirs(self.entries_directory)
+            with io.open(stamp_path, mode='wb'):
+                pass
+        except (IOError, OSError):
+            return 0
+        evicted = 0
+        for root, _, files in os.walk(self.entries_directory):
+            for filename in files:
+                if not filename.endswith('.json'):
+                    continue
+                entry_path = os.path.join(root, filename)
+                try:
+                    with io.open(entry_path, mode='rt',
+                                 encoding='utf8') as handle:
+                        filepath = json.load(handle)['path']
+                except (IOError, OSError, ValueError, KeyError, TypeError):
+                    filepath = None
+                if filepath is None or not os.path.exists(filepath):
+                    try:
+                        os.remove(entry_path)
+                        evicted += 1
+                    except OSError:
+                        pass
+        return evicted
+
+
+class ImportBaseline(object):
+    """
+    On-disk store of the import statements found in every file of a source
+    code directory when checked at a git commit, alongside the files that
+    differed from that commit (and so were not checked as committed).
+
+    Baselines are keyed by commit and by a digest of the options that affect
+    which imports are found; only the most recently stored BASELINES_KEPT are
+    kept.
+    """
+
+    def __init__(self, directory):
+        self.directory = os.path.join(
+            directory, 'baselines',
+            '%s-py%d.%d' % ((__version__,) + sys.version_info[:2]))
+
+    def _baseline_path(self, commit, key):
+        return os.path.join(self.directory, '%s-%s.json' % (commit, key))
+
+    def load(self, commit, key):
+        """
+        Return the (files, dirty) of a baseline, where `files` maps each file
+        path to its (module, lineno, col_offset) statements, or None.
+        """
+        baseline = _load(self._baseline_path(commit, key))
+        # Guard against corrupt baselines
+        try:
+            if baseline['commit'] != commit:
+                return None
+            files = dict(
+                (filepath, [tuple(statement) for statement in statements])
+                for filepath, statements in baseline['files'].items())
+            return files, set(baseline['dirty'])
+        except (KeyError, TypeError, AttributeError):
+            return None
+
+    def store(self, commit, key, files, dirty):
+        _dump(self._baseline_path(commit, key), {
+            'commit': commit,
+            'files': files,
+            'dirty': sorted(dirty),
+        })
+        self.prune()
+
+    def prune(self):
+        try:
+            filenames = [filename for filename in os.listdir(self.directory)
+                         if filename.endswith('.json')]
+        except OSError:
+            return
+        baseline_paths = sorted(
+            (os.path.join(self.directory, filename)
+             for filename in filenames),
+            key=_mtime, reverse=True)
+        for baseline_path in baseline_paths[BASELINES_KEPT:]:
+            try:
+                os.remove(baseline_path)
+            except OSError:
+                pass
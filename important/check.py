@@ -3,18 +3,317 @@
 # in the LICENSE file.
 from __future__ import unicode_literals
 
+import heapq
+import json
+import os
+import tempfile
+
 from collections import defaultdict
 from important.parse import translate_req_to_module_names
 
 
+# Number of records sorted in memory before they are spilled to a file
+SPOOL_RUN_SIZE = 100000
+
+
 def _base_module_name(import_statement):
     return import_statement.module.split('.')[0]
 
 
+def _module_levels(module):
+    # Each dotted level of a module, e.g. `a`, `a.b` and `a.b.c` for `a.b.c`
+    if '.' not in module:
+        return (module,)
+    names = module.split('.')
+    return ['.'.join(names[:level]) for level in range(1, len(names) + 1)]
+
+
+def _directories(path):
+    # The directories, relative to the root of the trie, of a path given
+    # relative to it (using either separator)
+    if os.sep != '/':
+        path = path.replace(os.sep, '/')
+    return [directory for directory in path.split('/')
+            if directory and directory != '.']
+
+
+class FrequencyTrie(object):
+    """
+    Frequencies of imports counted at every dotted level of their modules
+    (e.g. `google`, `google.protobuf` and `google.protobuf.message` for an
+    import of `google.protobuf.message`) within each directory containing
+    the files that import them, in one pass.
+
+    Directories are kept as a trie of the paths of files relative to its
+    root.  If scopes (directories relative to the root) are given, only
+    those directories (and their parents) are counted; otherwise every
+    directory is.
+    """
+
+    def __init__(self, imports=(), scopes=None):
+        self.frequencies = defaultdict(int)
+        self.children = {}
+        self._grow = scopes is None
+        for scope in scopes or ():
+            node = self
+            for directory in _directories(scope):
+                if directory not in node.children:
+                    node.children[directory] = FrequencyTrie(scopes=())
+                node = node.children[directory]
+        self._filename = None
+        self._nodes = [self]
+        self._levels = {}
+        self.update(imports)
+
+    def _path(self, filename):
+        # The nodes of the directories containing a file that are counted
+        nodes = [self]
+        if self.children or self._grow:
+            for directory in _directories(filename)[:-1]:
+                node = nodes[-1]
+                child = node.children.get(directory)
+                if child is None:
+                    if not node._grow:
+                        break
+                    child = node.children[directory] = FrequencyTrie()
+                nodes.append(child)
+        return nodes
+
+    def add(self, import_statement):
+        # Returns the levels of the module imported
+        module, filename = import_statement.module, import_statement.filename
+        if filename != self._filename:
+            self._filename = filename
+            self._nodes = self._path(filename)
+        levels = self._levels.get(module)
+        if levels is None:
+            levels = self._levels[module] = _module_levels(module)
+        if len(self._nodes) == 1:
+            frequencies = self.frequencies
+            for level in levels:
+                frequencies[level] += 1
+        else:
+            for node in self._nodes:
+                frequencies = node.frequencies
+                for level in levels:
+                    frequencies[level] += 1
+        return levels
+
+    def update(self, imports):
+        for import_statement in imports:
+            self.add(import_statement)
+        return self
+
+    def scope(self, directory=''):
+        """
+        Frequencies of the imports within a directory relative to the root.
+        """
+        node = self
+        for name in _directories(directory):
+            node = node.children.get(name)
+            if node is None:
+                return {}
+        return node.frequencies
+
+
+class SortedSpool(object):
+    """
+    Unique records, which are sorted in runs that are spilled to temporary
+    files once large and then merged, so that listing many records does not
+    require keeping them all in memory.
+    """
+
+    def __init__(self, run_size=SPOOL_RUN_SIZE):
+        self.run_size = run_size
+        self._run = []
+        self._files = []
+
+    def add(self, record):
+        self._run.append(record)
+        if len(self._run) >= self.run_size:
+            self._spill()
+
+    def _spill(self):
+        self._run.sort()
+        handle = tempfile.TemporaryFile()
+        for record in self._run:
+            handle.write(json.dumps(record).encode('utf8') + b'\n')
+        handle.seek(0)
+        self._files.append(handle)
+        self._run = []
+
+    def __iter__(self):
+        self._run.sort()
+        runs = [(tuple(json.loads(line.decode('utf8'))) for line in handle)
+                for handle in self._files]
+        runs.append(iter(self._run))
+        previous = None
+        for record in heapq.merge(*runs):
+            if record != previous:
+                yield record
+            previous = record
+
+    def close(self):
+        for handle in self._files:
+            handle.close()
+        self._files = []
+        self._run = []
+
+
+class ImportSummary(object):
+    """
+    Summary of a stream of imports that keeps only what is needed to check
+    them: the base modules imported and the frequency of each module, within
+    SOURCECODE and each of the scopes (directories relative to it) given.
+
+    Imports repeated within a file are counted once and files are counted as
+    they change, so imports must be grouped by file (as they are parsed).
+    If detailed, files and imports are also kept in sorted spools.
+    """
+
+    def __init__(self, imports=(), detailed=False, scopes=()):
+        self.base_modules = set()
+        self.frequencies = FrequencyTrie(scopes=scopes)
+        self.module_frequencies = self.frequencies.frequencies
+        self.imports = 0
+        self.files = 0
+        self.filenames = SortedSpool() if detailed else None
+        self.statements = SortedSpool() if detailed else None
+        self._filename = None
+        self._file_statements = set()
+        self.update(imports)
+
+    def add(self, import_statement):
+        module, filename, lineno, col_offset = import_statement
+        if filename != self._filename:
+            self._filename = filename
+            self._file_statements = set()
+            self.files += 1
+            if self.filenames is not None:
+                self.filenames.add((filename,))
+        if (module, lineno, col_offset) in self._file_statements:
+            return
+        self._file_statements.add((module, lineno, col_offset))
+        self.imports += 1
+        if self.statements is not None:
+            self.statements.add(tuple(import_statement))
+        self.base_modules.add(self.frequencies.add(import_statement)[0])
+
+    def update(self, imports):
+        for import_statement in imports:
+            self.add(import_statement)
+        return self
+
+    def close(self):
+        for spool in (self.filenames, self.statements):
+            if spool is not None:
+                spool.close()
+
+
+def requirement_modules(requirements):
+    """
+    The names of the modules by whose imports requirements (or constraints)
+    are checked.
+    """
+    modules = set()
+    for requirement in requirements:
+        modules.add(requirement.name)
+        modules.update(translate_req_to_module_names(requirement.name))
+    return modules
+
+
+def _upper_bound(specifier):
+    # The largest frequency allowed by a constraint, if any
+    bounds = []
+    for clause in specifier:
+        try:
+            frequency = int(clause.version)
+        except ValueError:
+            continue
+        if clause.operator == '<':
+            bounds.append(frequency - 1)
+        elif clause.operator in ('<=', '==', '==='):
+            bounds.append(frequency)
+    return min(bounds) if bounds else None
+
+
+class FailFast(object):
+    """
+    Summary of a stream of imports that is decided as soon as further imports
+    cannot change the outcome of checking it: once every requirement has been
+    imported, if there are no constraints, or once a constraint's upper bound
+    has been exceeded, as frequencies only increase.  Constraints within
+    scopes are given as (scope, requirements).
+    """
+
+    def __init__(self, summary, requirements, constraints,
+                 scoped_constraints=()):
+        self.summary = summary
+        self.violated = []
+        # Requirements are used as check_unused_requirements finds them
+        self._unused = set(requirement.name for requirement in requirements)
+        self._used_by = {}
+        for requirement in self._unused:
+            for module in translate_req_to_module_names(requirement):
+                self._used_by[module] = requirement
+        for requirement in self._unused:
+            self._used_by.setdefault(requirement, requirement)
+        self._passes = not constraints and not scoped_constraints
+        self._bounds = defaultdict(list)
+        for scope, scope_constraints in \
+                [('', constraints)] + list(scoped_constraints):
+            for requirement in scope_constraints:
+                bound = _upper_bound(requirement.specifier)
+                if bound is None:
+                    continue
+                for module in translate_req_to_module_names(
+                        requirement.name):
+                    self._bounds[module].append((bound, scope, requirement))
+        self._base_modules = set(self._used_by) | set(
+            module.split('.')[0] for module in self._bounds)
+
+    @property
+    def decided(self):
+        return bool(self.violated) or (self._passes and not self._unused)
+
+    def add(self, import_statement):
+        # Summarise an import, returning whether the outcome is decided
+        self.summary.add(import_statement)
+        module = import_statement.module
+        base_module = module.split('.')[0]
+        if base_module in self._base_modules:
+            self._unused.discard(self._used_by.get(base_module))
+            for level in _module_levels(module):
+                for bound in self._bounds.get(level, ()):
+                    self._check_bound(level, *bound)
+        return self.decided
+
+    def _check_bound(self, module, bound, scope, requirement):
+        if self.summary.frequencies.scope(scope).get(module, 0) > bound and \
+                (scope, requirement) not in self.violated:
+            self.violated.append((scope, requirement))
+
+    def violated_constraints(self):
+        """
+        The constraints found to be violated, and those within each scope.
+        """
+        scopes = []
+        constraints = defaultdict(list)
+        for scope, requirement in self.violated:
+            if scope not in constraints:
+                scopes.append(scope)
+            constraints[scope].append(requirement)
+        return constraints.pop('', []), \
+            [(scope, constraints[scope]) for scope in scopes if scope]
+
+
 def check_unused_requirements(imports, requirements):
     # Parse base imports
-    imports = set(_base_module_name(import_statement)
-                  for import_statement in imports)
+    if isinstance(imports, ImportSummary):
+        imports = imports.base_modules
+    else:
+        imports = set(_base_module_name(import_statement)
+                      for import_statement in imports)
     requirements = set(requirement.name for requirement in requirements)
     # Translate package names into module names that can be imported
     module_requirements = {}
@@ -31,22 +330,21 @@ def check_unused_requirements(imports, requirements):
 
 
 def frequency_count_imports(imports):
-    module_frequencies = defaultdict(int)
-    for import_statement in imports:
-        module_frequencies[import_statement.module] += 1
-        if '.' in import_statement.module:
-            module_frequencies[
-                _base_module_name(import_statement)
-            ] += 1
-    return module_frequencies
+    return FrequencyTrie(imports, scopes=()).frequencies
 
 
-def check_import_frequencies(imports, requirements):
+def check_import_frequencies(imports, requirements, scope=''):
+    # Imports may be summarised (or counted) once and then checked against
+    # the constraints of each scope (a directory relative to SOURCECODE)
     constraints = dict()
     for requirement in requirements:
-        if requirement.req.specifier:
-            constraints[requirement.name] = requirement.req.specifier
-    module_frequencies = frequency_count_imports(imports)
+        if requirement.specifier:
+            constraints[requirement.name] = requirement.specifier
+    if isinstance(imports, ImportSummary):
+        imports = imports.frequencies
+    if not isinstance(imports, FrequencyTrie):
+        imports = FrequencyTrie(imports, scopes=[scope])
+    module_frequencies = imports.scope(scope)
     violations = dict()
     for requirement, constraint in constraints.items():
         modules = translate_req_to_module_names(requirement)
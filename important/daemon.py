@@ -0,0 +1,156 @@
+# Copyright (c) 2016-2017 Chris Fournier. All rights reserved.
+# Use of this source code is governed by a MIT-style license that can be found
+# in the LICENSE file.
+from __future__ import unicode_literals
+
+import hashlib
+import json
+import os
+import socket
+import stat
+import sys
+import tempfile
+
+
+# Seconds that clients wait to connect to a daemon
+CONNECT_TIMEOUT = 1.0
+
+
+def available():
+    """
+    Return whether daemons can be served and queried on this platform, which
+    requires Unix sockets and user IDs.
+    """
+    return hasattr(socket, 'AF_UNIX') and hasattr(os, 'getuid')
+
+
+def _owned(path, is_type):
+    try:
+        status = os.lstat(path)
+    except OSError:
+        return False
+    return is_type(status.st_mode) and status.st_uid == os.getuid()
+
+
+def _socket_directory():
+    # Sockets are kept in a directory that only the current user can access
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime and os.path.isdir(runtime):
+        return os.path.join(runtime, 'important')
+    directory = os.path.join(tempfile.gettempdir(),
+                             'important-%d' % os.getuid())
+    if os.path.lexists(directory) and (
+            not _owned(directory, stat.S_ISDIR) or
+            os.lstat(directory).st_mode & 0o077):
+        raise ValueError('%s is not a directory private to the current user'
+                         % directory)
+    return directory
+
+
+def default_socket_path(directory):
+    """
+    Return the path of the socket of the daemon serving `directory` from
+    this Python environment, within a directory private to the current user.
+    """
+    # Paths of Unix sockets are limited to about a hundred characters, so the
+    # directory and environment are hashed
+    digest = hashlib.sha1(json.dumps(
+        [os.path.realpath(directory), sys.prefix]).encode('utf8'))
+    return os.path.join(_socket_directory(),
+                        '%s.sock' % digest.hexdigest()[:12])
+
+
+def _send(connection, message):
+    connection.sendall(json.dumps(message).encode('utf8') + b'\n')
+
+
+def _receive(connection):
+    chunks = []
+    while True:
+        chunk = connection.recv(64 * 1024)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        if chunk.endswith(b'\n'):
+            break
+    return json.loads(b''.join(chunks).decode('utf8'))
+
+
+def _connect(socket_path, timeout=CONNECT_TIMEOUT):
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.settimeout(timeout)
+    try:
+        connection.connect(socket_path)
+    except socket.error:
+        connection.close()
+        raise
+    connection.settimeout(None)
+    return connection
+
+
+def query(socket_path, request):
+    """
+    Send a request to the daemon listening on `socket_path`, returning its
+    response, or None if no daemon is listening.
+    """
+    # Only sockets of the current user's daemons are trusted
+    if not available() or not _owned(socket_path, stat.S_ISSOCK):
+        return None
+    try:
+        connection = _connect(socket_path)
+    except socket.error:
+        return None
+    try:
+        _send(connection, request)
+        return _receive(connection)
+    except (socket.error, ValueError):
+        return None
+    finally:
+        connection.close()
+
+
+def serve(socket_path, handle, ready=None):
+    """
+    Listen on `socket_path`, responding to each request with
+    `handle(request)` until interrupted.
+    """
+    if os.path.lexists(socket_path):
+        if not stat.S_ISSOCK(os.lstat(socket_path).st_mode):
+            raise ValueError('%s exists and is not a socket' % socket_path)
+        try:
+            _connect(socket_path).close()
+        except socket.error:
+            # Remove the socket of a daemon that has exited
+            os.remove(socket_path)
+        else:
+            raise ValueError('A daemon is already listening on %s' %
+                             socket_path)
+    directory = os.path.dirname(socket_path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory, 0o700)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        # Only allow the current user to connect
+        umask = os.umask(0o177)
+        try:
+            server.bind(socket_path)
+        finally:
+            os.umask(umask)
+        server.listen(16)
+        if ready is not None:
+            ready()
+        while True:
+            connection, _ = server.accept()
+            try:
+                _send(connection, handle(_receive(connection)))
+            except (socket.error, ValueError):
+                # Clients may disconnect or send invalid requests
+                pass
+            finally:
+                connection.close()
+    finally:
+        server.close()
+        try:
+            os.remove(socket_path)
+        except OSError:
+            pass
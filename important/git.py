@@ -0,0 +1,219 @@
+# Copyright (c) 2016-2017 Chris Fournier. All rights reserved.
+# Use of this source code is governed by a MIT-style license that can be found
+# in the LICENSE file.
+from __future__ import unicode_literals
+
+import hashlib
+import json
+import os
+import stat
+import subprocess
+
+from collections import defaultdict
+
+from important.cache import ImportBaseline
+from important.parse import _is_script, _walk_files, parse_files_imports, \
+    Exclusions, Import, EXECUTABLE_MODE, STATISTICS
+from important.store import ImportStore
+
+
+def _git(directory, *args):
+    try:
+        process = subprocess.Popen(('git',) + args, cwd=directory,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+    except OSError as exc:
+        raise ValueError('Cannot run git: %s' % exc)
+    output, error = process.communicate()
+    if process.returncode != 0:
+        raise ValueError('git %s failed: %s' % (
+            args[0], error.decode('utf8', 'replace').strip()))
+    return output.decode('utf8')
+
+
+def _paths(output):
+    # Split NUL separated '/' paths, as output by git using -z
+    return set(os.path.normpath(path) for path in output.split('\0') if path)
+
+
+def resolve_commit(directory, ref):
+    try:
+        return _git(directory, 'rev-parse', '--verify', '--quiet',
+                    ref + '^{commit}').strip()
+    except ValueError:
+        raise ValueError('%s is not a commit in the git repository at %s' %
+                         (ref, directory))
+
+
+def git_directory(directory):
+    return os.path.join(directory, _git(directory, 'rev-parse', '--git-dir')
+                        .strip())
+
+
+def changed_files(directory, commit):
+    # Files within `directory`, relative to it, whose content differs from
+    # `commit` (including those added or deleted since)
+    return _paths(_git(directory, 'diff', '--name-only', '--no-renames',
+                       '--relative', '-z', commit, '--'))
+
+
+def tracked_files(directory):
+    # Files within `directory`, relative to it, that are tracked by git
+    return _paths(_git(directory, 'ls-files', '-z'))
+
+
+def _index_modes(directory):
+    # The modes, as staged in the index, of the files within `directory`
+    # that are tracked by git and not deleted, by '/' path relative to it
+    modes = {}
+    for line in _git(directory, 'ls-files', '-z', '--stage').split('\0'):
+        if line:
+            info, _, path = line.partition('\t')
+            modes[path] = int(info.split(' ', 1)[0], 8)
+    for path in _git(directory, 'ls-files', '-z', '--deleted').split('\0'):
+        modes.pop(path, None)
+    return modes
+
+
+def git_source_files(directory, exclusions=None, untracked=False):
+    """
+    Return the paths of the Python files and scripts within `directory` (a
+    git repository or a directory within one) that are tracked by git and,
+    if `untracked`, those that are untracked but not ignored (e.g. by
+    `.gitignore`), listing them from git's index rather than walking the
+    directory; only the scripts among executable files are read.
+    """
+    directory = os.path.realpath(directory)
+    if not isinstance(exclusions, Exclusions):
+        exclusions = Exclusions(exclusions)
+    paths = _index_modes(directory)
+    if untracked:
+        for path in _git(directory, 'ls-files', '-z', '--others',
+                         '--exclude-standard').split('\0'):
+            if path:
+                paths[path] = None
+    filepaths = []
+    for path in sorted(paths):
+        mode = paths[path]
+        if exclusions and exclusions.excludes_relative(directory, path):
+            STATISTICS['excluded'] += 1
+            continue
+        filepath = os.path.join(directory, *path.split('/'))
+        if path.endswith('.py'):
+            # Submodules are staged as commits rather than files
+            if mode is None or stat.S_ISREG(mode) or stat.S_ISLNK(mode):
+                filepaths.append(filepath)
+        elif mode is None or (stat.S_ISREG(mode) and
+                              mode & EXECUTABLE_MODE):
+            if _is_script(filepath):
+                filepaths.append(filepath)
+    return filepaths
+
+
+def parse_git_files_imports(current_directory, exclusions=None, jobs=1,
+                            cache=None, parser='ast', untracked=False,
+                            read_threads=None, prefilter=None):
+    """
+    Parse imports as `parse_files_imports` does, but of the files listed by
+    `git_source_files` rather than those found by walking the directory.
+    Raises ValueError if the directory is not within a git repository.
+    """
+    current_directory = os.path.realpath(current_directory)
+    if not isinstance(exclusions, Exclusions):
+        exclusions = Exclusions(exclusions)
+    # Skip if this directory is supposed to be excluded
+    if exclusions.excludes(current_directory):
+        return
+    filepaths = git_source_files(current_directory, exclusions, untracked)
+    for statement in parse_files_imports(filepaths, current_directory, jobs,
+                                         cache, parser, read_threads,
+                                         prefilter):
+        yield statement
+
+
+def _baseline_key(directory, exclusions, parser):
+    # Digest of the options that affect which imports are found
+    key = [directory, parser, sorted(exclusions.paths)]
+    for pattern in (exclusions.absolute_pattern, exclusions.relative_pattern):
+        key.append(pattern.pattern if pattern is not None else None)
+    return hashlib.sha1(json.dumps(key).encode('utf8')).hexdigest()
+
+
+def parse_dir_imports_since(current_directory, since, exclusions=None,
+                            jobs=1, cache=None, parser='ast',
+                            baseline_directory=None, read_threads=None):
+    """
+    Parse imports as `parse_dir_imports` does, but parse only those files
+    added or modified since the baseline stored when `since` (or otherwise
+    HEAD) was last checked, reusing the imports of every other file; a
+    baseline of HEAD is then stored for subsequent runs.
+    """
+    current_directory = os.path.realpath(current_directory)
+    if not isinstance(exclusions, Exclusions):
+        exclusions = Exclusions(exclusions)
+    # Skip if this directory is supposed to be excluded
+    if exclusions.excludes(current_directory):
+        return []
+    head = resolve_commit(current_directory, 'HEAD')
+    commits = [resolve_commit(current_directory, since)]
+    if commits[0] != head:
+        commits.append(head)
+    if baseline_directory is None:
+        baseline_directory = os.path.join(git_directory(current_directory),
+                                          'important')
+    baselines = ImportBaseline(baseline_directory)
+    key = _baseline_key(current_directory, exclusions, parser)
+
+    # Reuse the imports of files that are tracked and unchanged since the
+    # baseline's commit, unless they differed from it when it was stored
+    baseline_files = {}
+    changed = set()
+    changed_since_head = None
+    for commit in commits:
+        baseline = baselines.load(commit, key)
+        if baseline is not None:
+            baseline_files, dirty = baseline
+            changed = changed_files(current_directory, commit)
+            if commit == head:
+                changed_since_head = changed
+            changed = changed | dirty
+            break
+    tracked = tracked_files(current_directory) if baseline_files else set()
+
+    filepaths = []
+    unchanged = set()
+    for filepath in _walk_files(current_directory, exclusions):
+        relative_path = os.path.relpath(filepath, current_directory)
+        filepaths.append(relative_path)
+        if relative_path in baseline_files and relative_path in tracked and \
+                relative_path not in changed:
+            unchanged.add(relative_path)
+    STATISTICS['unchanged_since_baseline'] += len(unchanged)
+
+    parsed = defaultdict(list)
+    for statement in parse_files_imports(
+            (os.path.join(current_directory, relative_path)
+             for relative_path in filepaths
+             if relative_path not in unchanged),
+            current_directory, jobs, cache, parser, read_threads):
+        parsed[statement.filename].append(statement)
+
+    # Merge imports in the order in which they would have been parsed
+    files = {}
+    imports = ImportStore()
+    for relative_path in filepaths:
+        if relative_path in unchanged:
+            statements = baseline_files[relative_path]
+            imports.extend(Import(module, relative_path, lineno, col_offset)
+                           for module, lineno, col_offset in statements)
+        else:
+            statements = [(statement.module, statement.lineno,
+                           statement.col_offset)
+                          for statement in parsed[relative_path]]
+            imports.extend(parsed[relative_path])
+        files[relative_path] = statements
+
+    if changed_since_head is None:
+        changed_since_head = changed_files(current_directory, head)
+    baselines.store(head, key, files, changed_since_head)
+    return imports
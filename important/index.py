@@ -0,0 +1,121 @@
+# Copyright (c) 2016-2017 Chris Fournier. All rights reserved.
+# Use of this source code is governed by a MIT-style license that can be found
+# in the LICENSE file.
+from __future__ import unicode_literals
+
+import os
+
+from important.cache import stat_key
+from important.parse import _is_script, _walk_files, parse_files_imports, \
+    Exclusions
+from important.store import ImportStore
+
+
+def _stat_key(filepath):
+    try:
+        return tuple(stat_key(os.stat(filepath)))
+    except OSError:
+        return None
+
+
+class ImportIndex(object):
+    """
+    In-memory index of the imports found in each file of a directory, which
+    can be updated by parsing again only those files that have changed.
+    """
+
+    def __init__(self, directory, exclusions=None, cache=None, parser='ast'):
+        self.directory = os.path.realpath(directory)
+        self.exclusions = exclusions if isinstance(exclusions, Exclusions) \
+            else Exclusions(exclusions)
+        self.cache = cache
+        self.parser = parser
+        self.store = ImportStore()
+        self.stats = {}
+
+    def __len__(self):
+        return len(self.stats)
+
+    def imports(self):
+        return iter(self.store)
+
+    def _relative_path(self, path):
+        relative_path = os.path.relpath(path, self.directory)
+        if relative_path == os.curdir:
+            return None
+        return relative_path.replace(os.sep, '/')
+
+    def _parse(self, filepaths, jobs=1):
+        # Parse files given their absolute paths
+        filenames = set()
+        for filepath in filepaths:
+            filename = os.path.relpath(filepath, self.directory)
+            filenames.add(filename)
+            self.stats[filename] = _stat_key(filepath)
+        self.store.remove(filenames)
+        self.store.extend(parse_files_imports(filepaths, self.directory, jobs,
+                                              self.cache, self.parser))
+        return len(filenames)
+
+    def _remove(self, path):
+        # Remove a file, or all of the files within a directory
+        filename = os.path.relpath(path, self.directory)
+        prefix = '' if filename == os.curdir else filename + os.sep
+        removed = [indexed for indexed in self.stats
+                   if indexed == filename or indexed.startswith(prefix)]
+        for indexed in removed:
+            del self.stats[indexed]
+        self.store.remove(removed)
+        return len(removed)
+
+    def build(self, jobs=1):
+        self.store = ImportStore()
+        self.stats = {}
+        if self.exclusions.excludes(self.directory):
+            return 0
+        return self._parse(list(_walk_files(self.directory, self.exclusions)),
+                           jobs)
+
+    def update(self, paths):
+        """
+        Update the index given paths of files or directories that were
+        created, modified or removed, returning the number of files parsed
+        again or removed; paths outside of the directory are ignored.
+        """
+        filepaths = set()
+        removed = 0
+        for path in sorted(set(os.path.abspath(path) for path in paths)):
+            if path != self.directory and \
+                    not path.startswith(self.directory + os.sep):
+                continue
+            if self.exclusions.excludes(path, self.directory):
+                removed += self._remove(path)
+            elif os.path.isdir(path):
+                # Rescan directories that were created or moved
+                removed += self._remove(path)
+                filepaths.update(_walk_files(path, self.exclusions,
+                                             self._relative_path(path)))
+            elif os.path.isfile(path) and \
+                    (path.endswith('.py') or _is_script(path)):
+                filepaths.add(path)
+            else:
+                removed += self._remove(path)
+        if filepaths:
+            return removed + self._parse(sorted(filepaths))
+        return removed
+
+    def refresh(self):
+        """
+        Update the index by walking the directory for files that have been
+        created, removed or modified (given their sizes and modification
+        times) since they were indexed, returning the number updated.
+        """
+        paths = set(os.path.join(self.directory, filename)
+                    for filename in self.stats)
+        for filepath in _walk_files(self.directory, self.exclusions):
+            filename = os.path.relpath(filepath, self.directory)
+            if self.stats.get(filename) == _stat_key(filepath):
+                paths.discard(filepath)
+            else:
+                paths.add(filepath)
+        return self.update(paths) if paths else 0
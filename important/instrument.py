@@ -0,0 +1,137 @@
+# Copyright (c) 2016-2017 Chris Fournier. All rights reserved.
+# Use of this source code is governed by a MIT-style license that can be found
+# in the LICENSE file.
+from __future__ import unicode_literals
+
+import json
+import time
+
+from contextlib import contextmanager
+
+
+# Statistics of the files walked and parsed that are reported
+FILE_STATISTICS = (
+    ('read', 'files_read'),
+    ('bytes_read', 'bytes_read'),
+    ('excluded', 'excluded'),
+    ('skipped_no_imports', 'skipped_no_imports'),
+    ('skipped_prefilter', 'skipped_prefilter'),
+    ('skipped_syntax_error', 'skipped_syntax_error'),
+    ('skipped_decode_error', 'skipped_decode_error'),
+    ('unchanged_since_baseline', 'unchanged_since_baseline'),
+)
+# Time spent within the scan phase
+SCAN_STATISTICS = (
+    ('walk', 'seconds_walk'),
+    ('read', 'seconds_read'),
+    ('parse', 'seconds_parse'),
+)
+
+
+class Profile(object):
+    """
+    Wall time taken by each phase of a check (in total, if a phase is
+    entered repeatedly) and, if traced, the peak memory allocated by this
+    process (tracing slows allocation, and so the check); memory allocated
+    by processes parsing files in parallel is not traced.
+    """
+
+    def __init__(self, trace_memory=False):
+        self.phases = []
+        self._phase_seconds = {}
+        self._start = time.time()
+        self._tracemalloc = None
+        if trace_memory:
+            # Imported only when tracing, as importing it slows startup
+            try:
+                import tracemalloc
+            except ImportError:  # Python < 3.4
+                return
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._tracemalloc = tracemalloc
+
+    @contextmanager
+    def phase(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            if name not in self._phase_seconds:
+                self.phases.append(name)
+                self._phase_seconds[name] = 0
+            self._phase_seconds[name] += time.time() - start
+
+    def report(self, statistics, slowest_files, summaries):
+        """
+        Stop profiling, returning a report given the statistics and slowest
+        files of parsing, and summaries of the imports found.
+        """
+        peak_memory = None
+        if self._tracemalloc is not None:
+            _, peak_memory = self._tracemalloc.get_traced_memory()
+            self._tracemalloc.stop()
+            self._tracemalloc = None
+        return {
+            'seconds': time.time() - self._start,
+            'phases': [{'phase': name, 'seconds': self._phase_seconds[name]}
+                       for name in self.phases],
+            'scan': dict((name, statistics[key])
+                         for name, key in SCAN_STATISTICS),
+            'files': dict((name, statistics[key])
+                          for name, key in FILE_STATISTICS),
+            'imports': sum(summary.imports for summary in summaries),
+            'files_with_imports': sum(summary.files
+                                      for summary in summaries),
+            'peak_memory_bytes': peak_memory,
+            'slowest_files': [
+                {'filename': filename, 'seconds': seconds}
+                for seconds, filename in sorted(slowest_files, reverse=True)],
+        }
+
+
+def _milliseconds(seconds):
+    return '{:.0f}ms'.format(seconds * 1000)
+
+
+def _size(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return '{:.1f}{}'.format(size, unit)
+        size /= 1024.0
+    return '{:.1f}GB'.format(size)
+
+
+def report_lines(report):
+    """
+    Yield the lines of a profile report in a human readable form.
+    """
+    yield 'Profile:'
+    for phase in report['phases']:
+        line = '  {:<14}{:>10}'.format(
+            phase['phase'], _milliseconds(phase['seconds']))
+        if phase['phase'] == 'scan':
+            line += ' ({})'.format(', '.join(
+                '{} {}'.format(name, _milliseconds(report['scan'][name]))
+                for name, _ in SCAN_STATISTICS))
+        yield line
+    yield '  {:<14}{:>10}'.format('total', _milliseconds(report['seconds']))
+    files = report['files']
+    yield ('Files: {read} read ({size}), {excluded} paths excluded, '
+           '{skipped_no_imports} without imports, {skipped_prefilter} not '
+           'naming any module checked, {skipped_syntax_error} with syntax '
+           'errors, {skipped_decode_error} with decode '
+           'errors').format(size=_size(files['bytes_read']), **files)
+    if report['peak_memory_bytes'] is not None:
+        yield 'Peak memory (main process): {}'.format(
+            _size(report['peak_memory_bytes']))
+    if report['slowest_files']:
+        yield 'Slowest files:'
+        for slowest_file in report['slowest_files']:
+            yield '  {:>10} {}'.format(_milliseconds(slowest_file['seconds']),
+                                       slowest_file['filename'])
+
+
+def write_report(report, path):
+    with open(path, 'w') as handle:
+        handle.write(json.dumps(report, indent=2, sort_keys=True))
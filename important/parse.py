@@ -4,166 +4,969 @@
 from __future__ import unicode_literals
 
 import ast
+import codecs
+import heapq
 import io
 import logging
+import mmap
 import os
 import pkgutil
 import re
 import stat
 import sys
+import time
 
-from collections import namedtuple
-from itertools import chain
+from collections import Counter, deque, namedtuple
+from functools import partial
+from itertools import chain, islice
 
-import pip
-
-from pip.commands.show import search_packages_info
-from pip.req import parse_requirements as pip_parse_requirements
+try:
+    from os import scandir
+except ImportError:  # Python < 3.5
+    from scandir import scandir
 
 
 RE_SHEBANG = re.compile('^#![^\n]*python[0-9]?$')
-ALL_MODULES = set(
-    m[1] for m in pkgutil.iter_modules()) | set(
-        sys.builtin_module_names)
+# Encoding declarations, which must be on one of the first two lines (see
+# PEP 263)
+RE_ENCODING_DECLARATION = re.compile(
+    br'^[ \t\f]*#.*?coding[:=][ \t]*([-\w.]+)')
+# Files at least this large are memory-mapped rather than read
+MMAP_THRESHOLD = 1024 * 1024
+# Number of bytes read from the start of executable files to find a shebang
+SHEBANG_LENGTH = 256
+EXECUTABLE_MODE = stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH
+RE_GLOB = re.compile('[*?[]')
+RE_NAME_SEPARATORS = re.compile('[-_.]+')
+# Extensions of modules installed as files in site-packages
+MODULE_EXTENSIONS = ('.py', '.so', '.pyd')
+# Names of modules distributed with Python where available (Python 3.10+);
+# otherwise, all importable modules are found when first needed
+STDLIB_MODULES = frozenset(getattr(sys, 'stdlib_module_names', ())) | \
+    frozenset(sys.builtin_module_names)
+_ALL_MODULES = None
+_DISTRIBUTION_MODULE_INDEX = None
+# Modification times of the directories on sys.path when the index was built
+_DISTRIBUTION_PATHS_STAMP = None
+# Requirements parsed from each file, keyed by path, modification time and size
+_REQUIREMENTS_FILES = {}
+
+# Requirements files (see https://pip.pypa.io/en/stable/reference/
+# requirements-file-format/)
+RE_REQUIREMENT_COMMENT = re.compile(r'(^|\s+)#.*$')
+RE_ENVIRONMENT_VARIABLE = re.compile(r'\$\{([A-Z0-9_]+)\}')
+RE_REQUIREMENT_OPTION = re.compile(r'(-[a-zA-Z]|--[a-z][-a-z]*)(?:=|\s*)(.*)')
+RE_REQUIREMENT_URL = re.compile(r'[a-zA-Z][-a-zA-Z0-9+.]*://|file:|[.~/\\]')
+RE_EGG_FRAGMENT = re.compile(r'[#&]egg=([^&]+)')
+REQUIREMENT_OPTIONS = {
+    '-r': 'requirement',
+    '--requirement': 'requirement',
+    '-c': 'constraint',
+    '--constraint': 'constraint',
+    '-e': 'editable',
+    '--editable': 'editable',
+}
 
 Import = namedtuple('Import', ['module', 'filename', 'lineno', 'col_offset'])
+Requirement = namedtuple('Requirement', ['name', 'specifier', 'extras',
+                                         'marker', 'constraint', 'filename',
+                                         'lineno'])
 
 LOGGER = logging.getLogger()
 
+# Counters of work done while parsing (e.g. files skipped by the prefilter),
+# and the seconds spent walking, reading and parsing files
+STATISTICS = Counter()
+# The (seconds, filename) taken to read and parse the slowest files
+SLOWEST_FILES = []
+SLOWEST_FILES_KEPT = 10
 
-def _imports(source, filepath):
-    def _ast_imports(root):
-        for node in ast.iter_child_nodes(root):
+# Number of files that a directory must contain before parsing is spread over
+# a pool of processes; smaller trees are parsed serially to avoid the cost of
+# starting the pool
+PARALLEL_THRESHOLD = 64
+PARALLEL_CHUNKSIZE = 16
+# Number of files per reader thread that may be read ahead of the parser;
+# reading stops while this many files are waiting to be parsed
+READ_AHEAD = 4
+
+
+# Fields of nodes that may contain statements (e.g. the clauses of `try`)
+STATEMENT_FIELDS = frozenset(['body', 'orelse', 'handlers', 'finalbody',
+                              'cases'])
+_NODE_STATEMENT_FIELDS = {}
+
+
+def _statement_fields(node):
+    node_type = type(node)
+    fields = _NODE_STATEMENT_FIELDS.get(node_type)
+    if fields is None:
+        fields = _NODE_STATEMENT_FIELDS[node_type] = tuple(
+            field for field in node_type._fields if field in STATEMENT_FIELDS)
+    return fields
+
+
+def _ast_imports(root):
+    # Walk statements depth-first in source order using a stack of iterators
+    # rather than recursion, never descending into expressions (which cannot
+    # contain import statements)
+    stack = [iter(root.body)]
+    while stack:
+        for node in stack[-1]:
             if isinstance(node, ast.ImportFrom):
                 yield (node.module, node.lineno, node.col_offset)
             elif isinstance(node, ast.Import):
                 for name in node.names:
                     yield (name.name, node.lineno, node.col_offset)
             else:
-                for statement in _ast_imports(node):
-                    yield statement
-    root = ast.parse(source, filename=filepath)
-    for statement in _ast_imports(root):
-        yield statement
+                fields = _statement_fields(node)
+                if fields:
+                    stack.append(chain.from_iterable(
+                        [getattr(node, field) for field in fields]))
+                    break
+        else:
+            stack.pop()
 
 
-def is_excluded(path, exclusions):
-    if exclusions:
-        for _ in chain(
-                (e for e in exclusions if os.path.samefile(path, e)),
-                (e for e in exclusions if
-                 os.path.samefile(os.path.dirname(path), e)),
-        ):
+def _source_encoding(source):
+    # Find the encoding of source bytes as the parser would
+    if source[:3] == codecs.BOM_UTF8:
+        return 'utf-8-sig'
+    for line in source[:1024].split(b'\n')[:2]:
+        match = RE_ENCODING_DECLARATION.match(line)
+        if match:
+            return match.group(1).decode('ascii')
+        if line.strip() and not line.lstrip().startswith(b'#'):
+            break
+    return 'utf-8'
+
+
+def _decode_source(source):
+    # Decode source bytes, leaving source that is already text as it is
+    if isinstance(source, type('')):
+        return source
+    return codecs.decode(source, _source_encoding(source))
+
+
+def _parse_source(source, filepath):
+    # Parse source bytes, which the parser decodes given any encoding
+    # declaration, raising UnicodeDecodeError for source it cannot decode
+    if sys.version_info[0] == 2:
+        # Python 2 assumes ASCII rather than UTF-8
+        source = _decode_source(source)
+        # Remove encoding declarations, which are invalid in unicode source
+        source = '\n'.join(
+            '' if l.startswith('#') else l for l in source.split('\n'))
+    try:
+        return ast.parse(source, filename=filepath)
+    except SyntaxError as exc:
+        if exc.msg.startswith('(unicode error)'):
+            _decode_source(source)
+        raise
+
+
+def _imports(source, filepath):
+    return _ast_imports(_parse_source(source, filepath))
+
+
+class _UnsupportedSource(Exception):
+    pass
+
+
+# Matches string literals and comments, which are skipped, and the keywords
+# that begin import statements
+RE_SCAN = re.compile(r'''
+    (?P<string>(?P<prefix>[rRbBuUfF]{0,2})
+        (?:"""[^"\\]*(?:(?:\\[\s\S]|"(?!""))[^"\\]*)*"""
+          |\'\'\'[^'\\]*(?:(?:\\[\s\S]|'(?!''))[^'\\]*)*\'\'\'
+          |"[^"\\\n]*(?:\\[\s\S][^"\\\n]*)*"
+          |'[^'\\\n]*(?:\\[\s\S][^'\\\n]*)*'))
+    |(?P<comment>\#[^\n]*)
+    |\b(?P<keyword>import|from)\b
+''', re.VERBOSE)
+
+# Since Python 3.12, f-strings may nest quotes of their own kind
+NESTED_FSTRINGS = sys.version_info >= (3, 12)
+
+
+def _scan_statement(source, start):
+    # Return the text of the statement beginning at `start`, following
+    # parentheses and backslashes onto subsequent lines
+    lines = []
+    depth = 0
+    while True:
+        end = source.find('\n', start)
+        end = len(source) if end == -1 else end
+        line = source[start:end].split('#', 1)[0]
+        if ';' in line:
+            lines.append(line.split(';', 1)[0])
+            break
+        lines.append(line)
+        depth += line.count('(') - line.count(')')
+        if end == len(source) or \
+                (depth <= 0 and not line.rstrip().endswith('\\')):
+            break
+        start = end + 1
+    return '\n'.join(lines)
+
+
+def _scan_imports(source):
+    lineno = 1
+    position = 0
+    for match in RE_SCAN.finditer(source):
+        if match.group('keyword') is None:
+            if NESTED_FSTRINGS and 'f' in match.group('prefix').lower() and \
+                    '{' in match.group('string'):
+                raise _UnsupportedSource(match.group('string'))
+            continue
+        start = match.start()
+        lineno += source.count('\n', position, start)
+        position = start
+        line_start = source.rfind('\n', 0, start) + 1
+        line_prefix = source[line_start:start].rstrip()
+        # Skip keywords that do not begin a statement (e.g. `yield from`)
+        if line_prefix and line_prefix[-1] not in ';:':
+            continue
+        # Parse only the statement itself; ast raises a SyntaxError if the
+        # keyword was not in fact the start of an import statement
+        nodes = ast.parse(_scan_statement(source, start)).body
+        if len(nodes) != 1:
+            raise _UnsupportedSource(nodes)
+        node = nodes[0]
+        # Column offsets are reported by ast in UTF-8 bytes
+        col_offset = len(source[line_start:start].encode('utf8'))
+        if isinstance(node, ast.ImportFrom):
+            yield (node.module, lineno, col_offset)
+        elif isinstance(node, ast.Import):
+            for name in node.names:
+                yield (name.name, lineno, col_offset)
+        else:
+            raise _UnsupportedSource(node)
+
+
+def _fast_imports(source, filepath):
+    # Find import statements by scanning source text and parsing only those
+    # statements, falling back to parsing an abstract syntax tree of the
+    # entire source if something unexpected is encountered (including source
+    # that cannot be decoded, which ast may yet parse or report)
+    try:
+        return list(_scan_imports(_decode_source(source)))
+    except (_UnsupportedSource, SyntaxError, LookupError,
+            UnicodeDecodeError):
+        return list(_imports(source, filepath))
+
+
+PARSERS = {
+    'ast': _imports,
+    'fast': _fast_imports,
+}
+
+
+def _glob_to_regex(pattern):
+    # Translate a glob into a regular expression in which `*` and `?` do not
+    # match path separators and `**/` matches any number of directories
+    regex = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            regex.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i):
+            regex.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            regex.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            regex.append('[^/]')
+            i += 1
+        elif pattern[i] == '[' and pattern.find(']', i + 2) != -1:
+            end = pattern.find(']', i + 2)
+            characters = pattern[i + 1:end].replace('\\', '\\\\')
+            if characters.startswith('!'):
+                characters = '^' + characters[1:]
+            regex.append('[%s]' % characters)
+            i = end + 1
+        else:
+            regex.append(re.escape(pattern[i]))
+            i += 1
+    return ''.join(regex) + r'\Z'
+
+
+class Exclusions(object):
+    """
+    Exclusions compiled once into a set of resolved paths, which exclude
+    themselves and everything within them, and globs (e.g. `**/test_*.py`),
+    which are matched against paths relative to the directory being parsed
+    unless they are absolute.
+    """
+
+    def __init__(self, exclusions=None):
+        self.paths = set()
+        absolute_globs = []
+        relative_globs = []
+        for exclusion in exclusions or ():
+            if RE_GLOB.search(exclusion):
+                exclusion = exclusion.replace(os.sep, '/')
+                if exclusion.startswith('/'):
+                    absolute_globs.append(_glob_to_regex(exclusion))
+                else:
+                    relative_globs.append(_glob_to_regex(exclusion))
+            else:
+                self.paths.add(os.path.realpath(exclusion))
+
+        def compile_globs(globs):
+            return re.compile('|'.join(globs)) if globs else None
+        self.absolute_pattern = compile_globs(absolute_globs)
+        self.relative_pattern = compile_globs(relative_globs)
+
+    def __bool__(self):
+        return bool(self.paths or self.absolute_pattern or
+                    self.relative_pattern)
+    __nonzero__ = __bool__
+
+    def match(self, path, relative_path=None):
+        # Match an absolute path, and its '/' separated path relative to the
+        # directory being parsed, but not any of their parents
+        if path in self.paths:
+            return True
+        if self.absolute_pattern is not None and \
+                self.absolute_pattern.match(path.replace(os.sep, '/')):
             return True
+        return relative_path is not None and \
+            self.relative_pattern is not None and \
+            bool(self.relative_pattern.match(relative_path))
+
+    def excludes(self, path, directory=None):
+        path = os.path.realpath(path)
+        relative_path = None
+        if directory is not None:
+            relative_path = os.path.relpath(path, os.path.realpath(directory))
+            if relative_path == os.curdir or relative_path == os.pardir or \
+                    relative_path.startswith(os.pardir + os.sep):
+                relative_path = None
+            else:
+                relative_path = relative_path.replace(os.sep, '/')
+        # Match the path and each of its parents
+        while True:
+            if self.match(path, relative_path):
+                return True
+            parent = os.path.dirname(path)
+            if parent == path:
+                return False
+            path = parent
+            if relative_path is not None:
+                relative_path = relative_path.rpartition('/')[0] or None
+
+    def excludes_relative(self, directory, path):
+        # Match a '/' separated path relative to `directory` (e.g. a member of
+        # an archive) and each of the directories containing it, for paths
+        # that are listed rather than walked
+        while path:
+            if self.match(os.path.join(directory, *path.split('/')), path):
+                return True
+            path = path.rpartition('/')[0]
+        return False
+
+
+def is_excluded(path, exclusions, directory=None):
+    if exclusions:
+        if not isinstance(exclusions, Exclusions):
+            exclusions = Exclusions(exclusions)
+        return exclusions.excludes(path, directory)
     return False
 
 
-def parse_file_imports(filepath, exclusions=None, directory=None):
-    # Skip if this file is supposed to be excluded
-    if is_excluded(filepath, exclusions):
-        return
-    # Create a directory to report filepaths relative to
-    if directory is None:
-        directory = os.path.dirname(filepath)
-    display_filepath = os.path.relpath(filepath, directory)
-    # Compile and parse abstract syntax tree and find import statements
+def _trie_pattern(names):
+    # A regular expression matching any of the (byte string) names, in which
+    # names sharing a prefix share its branch (e.g. `a(?:b|c)` for `ab` and
+    # `ac`) so that each position is matched against each prefix once
+    trie = {}
+    for name in names:
+        node = trie
+        for index in range(len(name)):
+            node = node.setdefault(name[index:index + 1], {})
+        node[b''] = {}
+
+    def pattern(node):
+        branches = [re.escape(character) + pattern(child)
+                    for character, child in sorted(node.items())
+                    if character]
+        optional = b'' in node
+        if not branches:
+            return b''
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        return b'(?:' + b'|'.join(branches) + b')' + (b'?' if optional
+                                                      else b'')
+    return pattern(trie)
+
+
+def module_prefilter(modules):
+    """
+    Compile a pattern that searches source bytes, in one pass, for the base
+    names of the modules given as whole words; source that imports any of the
+    modules must match it, so source that does not need not be parsed to
+    find their imports.
+    """
+    names = set(module.split('.')[0].encode('utf8') for module in modules)
+    if not names:
+        return re.compile(b'(?!)')
+    return re.compile(br'\b' + _trie_pattern(sorted(names)) + br'\b')
+
+
+def _source_imports(source, filepath, parser='ast', prefilter=None):
+    # Every import statement contains the `import` keyword, so files without it
+    # cannot contain imports and need not be decoded or parsed; nor need
+    # files without a match for the prefilter, if any
+    STATISTICS['files_read'] += 1
+    STATISTICS['bytes_read'] += len(source)
+    # Source may be memory-mapped, which `in` would search for a byte
+    if source.find(b'import') == -1:
+        STATISTICS['skipped_no_imports'] += 1
+        return ()
+    if prefilter is not None and prefilter.search(source) is None:
+        STATISTICS['skipped_prefilter'] += 1
+        return ()
+    start = time.time()
     try:
-        with io.open(filepath, mode='rt', encoding='utf8') as handle:
-            source = handle.read()
-        # Remove lines with only comments (e.g. PEP 263 encodings)
-        source = '\n'.join(
-            '' if l.startswith('#') else l for l in source.split('\n'))
-        # Parse
-        for statement in _imports(source, filepath):
-            module, lineno, col_offset = statement
-            yield Import(module, display_filepath, lineno, col_offset)
+        # Parse bytes, which are decoded (only) by the parser
+        return list(PARSERS[parser](source, filepath))
+    finally:
+        STATISTICS['seconds_parse'] += time.time() - start
+
+
+def _record_file_time(filename, seconds):
+    # Keep the slowest files read and parsed
+    if len(SLOWEST_FILES) < SLOWEST_FILES_KEPT:
+        heapq.heappush(SLOWEST_FILES, (seconds, filename))
+    elif seconds > SLOWEST_FILES[0][0]:
+        heapq.heapreplace(SLOWEST_FILES, (seconds, filename))
+
+
+def _statements_imports(statements, filepath, display_filepath):
+    # Yield the imports of the (module, lineno, col_offset) statements
+    # returned by `statements()`, which reads and parses a file, skipping
+    # files that cannot be decoded or parsed and timing each file
+    start = time.time()
+    seconds_parse = STATISTICS['seconds_parse']
+    STATISTICS['files_scanned'] += 1
+    try:
+        statements = statements()
     except SyntaxError as exc:
         LOGGER.warning('Skipping %s due to syntax error: %s',
                        exc.filename, str(exc))
+        STATISTICS['skipped_syntax_error'] += 1
+        statements = ()
     except UnicodeDecodeError as exc:
         LOGGER.warning('Skipping %s due to decode error: %s',
                        filepath, str(exc))
+        STATISTICS['skipped_decode_error'] += 1
+        statements = ()
+    finally:
+        seconds = time.time() - start
+        # Time not spent parsing was spent reading (or in the cache)
+        STATISTICS['seconds_read'] += \
+            seconds - (STATISTICS['seconds_parse'] - seconds_parse)
+        _record_file_time(display_filepath, seconds)
+    for statement in statements:
+        module, lineno, col_offset = statement
+        yield Import(module, display_filepath, lineno, col_offset)
 
 
-def _is_script(filepath):
-    if os.access(filepath, os.F_OK | os.R_OK | os.X_OK) and \
-       not stat.S_ISSOCK(os.stat(filepath).st_mode):
+def _read_file_imports(filepath, parser='ast', prefilter=None):
+    with io.open(filepath, mode='rb') as handle:
+        size = os.fstat(handle.fileno()).st_size
+        # Empty files cannot be mapped
+        if size < MMAP_THRESHOLD or size == 0:
+            return _source_imports(handle.read(), filepath, parser,
+                                   prefilter)
+        # Parse large files from the page cache without copying them
+        source = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
         try:
-            with io.open(filepath, mode='rt', encoding='utf8') as handle:
-                first_line = handle.readline()
-            return bool(RE_SHEBANG.match(first_line))
-        except UnicodeDecodeError as exc:
-            LOGGER.warning(
-                'Skipping %s due to decode error: %s', filepath, str(exc))
-    return False
+            return _source_imports(source, filepath, parser, prefilter)
+        finally:
+            source.close()
+
+
+def _read_source(filepath):
+    # Read the bytes of a Python file, or of an executable file if it is a
+    # Python script (otherwise None)
+    with io.open(filepath, mode='rb') as handle:
+        source = handle.read(SHEBANG_LENGTH)
+        if not filepath.endswith('.py') and not _has_python_shebang(source):
+            return None
+        if len(source) < SHEBANG_LENGTH:
+            return source
+        return source + handle.read()
+
+
+def _read_ahead(filepaths, threads):
+    # Read files in a pool of threads, which wait on I/O in parallel, while
+    # the caller parses those already read; yield (filepath, result) in
+    # order, where `result.get()` waits for (and returns) the file's source,
+    # keeping at most READ_AHEAD files per thread in memory
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(threads)
+    try:
+        pending = deque()
+        for filepath in filepaths:
+            pending.append(
+                (filepath, pool.apply_async(_read_source, (filepath,))))
+            if len(pending) >= threads * READ_AHEAD:
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _read_source_imports(result, filepath, parser='ast', prefilter=None):
+    source = result.get()
+    if source is None:
+        return ()
+    return _source_imports(source, filepath, parser, prefilter)
+
+
+def _parse_file_imports(filepath, directory, cache=None, parser='ast',
+                        result=None, prefilter=None):
+    display_filepath = os.path.relpath(filepath, directory)
+    # Compile and parse abstract syntax tree and find import statements,
+    # unless they have been cached for an unchanged file (as all of a
+    # file's imports are cached, cached files are not prefiltered)
+    if cache is not None:
+        statements = partial(cache.statements, filepath,
+                             partial(_source_imports, parser=parser))
+    elif result is not None:
+        # Wait for a file read ahead
+        statements = partial(_read_source_imports, result, filepath, parser,
+                             prefilter)
+    else:
+        statements = partial(_read_file_imports, filepath, parser,
+                             prefilter)
+    return _statements_imports(statements, filepath, display_filepath)
+
+
+def parse_file_imports(filepath, exclusions=None, directory=None, cache=None,
+                       parser='ast', prefilter=None):
+    # Create a directory to report filepaths relative to
+    if directory is None:
+        directory = os.path.dirname(filepath)
+    # Skip if this file is supposed to be excluded
+    if is_excluded(filepath, exclusions, directory):
+        STATISTICS['excluded'] += 1
+        return
+    for statement in _parse_file_imports(filepath, directory, cache, parser,
+                                         prefilter=prefilter):
+        yield statement
+
+
+def _is_script(filepath, file_stat=None, read_shebang=True):
+    # Only consider regular executable files, reusing a stat if given; the
+    # shebang may be left to be checked when the file is read
+    if file_stat is None:
+        try:
+            file_stat = os.stat(filepath)
+        except OSError:
+            return False
+    if not stat.S_ISREG(file_stat.st_mode) or \
+            not file_stat.st_mode & EXECUTABLE_MODE:
+        return False
+    if not read_shebang:
+        return True
+    # Read only a fixed prefix so that binaries are rejected cheaply
+    try:
+        with io.open(filepath, mode='rb') as handle:
+            prefix = handle.read(SHEBANG_LENGTH)
+    except (IOError, OSError):
+        return False
+    return _has_python_shebang(prefix)
 
 
-def parse_dir_imports(current_directory, exclusions=None):
+def _has_python_shebang(prefix):
+    if not prefix.startswith(b'#!'):
+        return False
+    first_line = prefix[:SHEBANG_LENGTH].split(b'\n', 1)[0].rstrip(b'\r')
+    try:
+        return bool(RE_SHEBANG.match(first_line.decode('utf8')))
+    except UnicodeDecodeError:
+        return False
+
+
+def _walk_files(current_directory, exclusions, relative_directory=None,
+                other_files=None, read_shebangs=True):
+    # Walk depth-first in the same order as os.walk, reusing the file types
+    # and stats cached by scandir and pruning excluded directories before
+    # they are scanned; time is measured only while walking, not while
+    # paths yielded are handled.  The paths of other files whose names are
+    # keys of `other_files` are appended to its values.  Unless shebangs
+    # are read, every executable file is yielded.
+    start = time.time()
+    directories = [(current_directory, relative_directory)]
+    subdirectories = []
+    entries = []
+    try:
+        while directories:
+            directory, relative_directory = directories.pop()
+            try:
+                entries = list(scandir(directory))
+            except OSError:
+                continue
+            subdirectories = []
+            # Entries are consumed from the end in order
+            entries.reverse()
+            while entries:
+                entry = entries.pop()
+                filename = entry.name.decode('utf8') \
+                    if hasattr(entry.name, 'decode') and \
+                    isinstance(entry.name, str) else entry.name
+                filepath = os.path.join(directory, filename)
+                relative_path = filename if relative_directory is None \
+                    else relative_directory + '/' + filename
+                if exclusions and exclusions.match(filepath, relative_path):
+                    STATISTICS['excluded'] += 1
+                    continue
+                elif entry.is_dir(follow_symlinks=False):
+                    subdirectories.append((filepath, relative_path))
+                elif other_files is not None and filename in other_files:
+                    if entry.is_file():
+                        other_files[filename].append(filepath)
+                elif entry.is_file() and (
+                        filename.endswith('.py') or
+                        _is_script(filepath, entry.stat(), read_shebangs)):
+                    STATISTICS['seconds_walk'] += time.time() - start
+                    STATISTICS['files_found'] += 1
+                    yield filepath
+                    start = time.time()
+            directories.extend(reversed(subdirectories))
+            subdirectories = []
+    finally:
+        # Count the directories left unwalked if the walk is stopped early
+        unwalked = len(directories) + len(subdirectories) + sum(
+            1 for entry in entries if entry.is_dir(follow_symlinks=False))
+        if unwalked:
+            STATISTICS['directories_not_walked'] += unwalked
+    STATISTICS['seconds_walk'] += time.time() - start
+
+
+def _parse_file_imports_list(args):
+    filepath, directory, cache, parser, prefilter = args
+    # Return the statistics of this worker process alongside its imports
+    STATISTICS.clear()
+    del SLOWEST_FILES[:]
+    statements = list(_parse_file_imports(filepath, directory, cache, parser,
+                                          prefilter=prefilter))
+    return statements, dict(STATISTICS), SLOWEST_FILES[:]
+
+
+def _parse_files_parallel(filepaths, directory, jobs, cache, parser,
+                          prefilter):
+    import multiprocessing
+    pool = multiprocessing.Pool(jobs)
+    try:
+        # The pool consumes paths from the walk in a background thread while
+        # files are parsed; results are returned in walk order
+        for statements, statistics, slowest_files in pool.imap(
+                _parse_file_imports_list,
+                ((filepath, directory, cache, parser, prefilter)
+                 for filepath in filepaths),
+                chunksize=PARALLEL_CHUNKSIZE):
+            STATISTICS.update(statistics)
+            for seconds, filename in slowest_files:
+                _record_file_time(filename, seconds)
+            for statement in statements:
+                yield statement
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def parse_dir_imports(current_directory, exclusions=None, jobs=1, cache=None,
+                      parser='ast', read_threads=None, prefilter=None):
+    current_directory = os.path.realpath(current_directory)
+    if not isinstance(exclusions, Exclusions):
+        exclusions = Exclusions(exclusions)
     # Skip if this directory is supposed to be excluded
-    if is_excluded(current_directory, exclusions):
+    if exclusions.excludes(current_directory):
         return
-    # Iterate over all Python/script files
-    for root, dirs, files in os.walk(current_directory, topdown=True):
-        dirs[:] = [os.path.join(root, d) for d in dirs if d not in exclusions]
-        for filename in files:
-            filename = filename.decode('utf8') \
-                if hasattr(filename, 'decode') and isinstance(filename, str) \
-                else filename
-            filepath = os.path.join(root, filename)
-            if filename.endswith('.py') or _is_script(filepath):
-                for statement in parse_file_imports(filepath, exclusions,
-                                                    current_directory):
-                    yield statement
+    # Iterate over all Python/script files, leaving the shebangs of scripts
+    # to be read ahead
+    filepaths = _walk_files(current_directory, exclusions,
+                            read_shebangs=not read_threads or
+                            cache is not None)
+    for statement in parse_files_imports(filepaths, current_directory, jobs,
+                                         cache, parser, read_threads,
+                                         prefilter):
+        yield statement
 
 
-def parse_requirements(filename):
-    requirements = pip_parse_requirements(filename,
-                                          session=pip.download.PipSession())
-    for requirement in requirements:
-        if not requirement.name:
-            raise ValueError(
-                'A requirement lacks a name (e.g. no `#egg` url)')
-        elif requirement.editable:
-            raise ValueError(
-                'Cannot parse %s: editable projects unsupported' %
-                requirement.name)
-        else:
-            yield requirement
+def parse_files_imports(filepaths, directory, jobs=1, cache=None,
+                        parser='ast', read_threads=None, prefilter=None):
+    """
+    Parse the imports of files, named relative to `directory`, in parallel
+    using `jobs` processes if there are enough of them.  Alternatively,
+    files may be read by a pool of `read_threads` threads, so that many
+    reads (e.g. from a network filesystem) are waited on at once, and parsed
+    in this process as they are read; cached files are not read ahead.
+    Files whose source does not match a `prefilter` (see
+    `module_prefilter`) are not parsed, unless cached.
+    """
+    if read_threads and cache is None:
+        statements = chain.from_iterable(
+            _parse_file_imports(filepath, directory, parser=parser,
+                                result=result, prefilter=prefilter)
+            for filepath, result in _read_ahead(filepaths, read_threads))
+        for statement in statements:
+            yield statement
+        return
+    # Parse files in parallel only if there are enough of them
+    if jobs is None:
+        import multiprocessing
+        jobs = multiprocessing.cpu_count()
+    filepaths = iter(filepaths)
+    head = list(islice(filepaths, PARALLEL_THRESHOLD if jobs > 1 else 0))
+    filepaths = chain(head, filepaths)
+    if jobs > 1 and len(head) >= PARALLEL_THRESHOLD:
+        statements = _parse_files_parallel(filepaths, directory, jobs, cache,
+                                           parser, prefilter)
+    else:
+        statements = chain.from_iterable(
+            _parse_file_imports(filepath, directory, cache, parser,
+                                prefilter=prefilter)
+            for filepath in filepaths)
+    for statement in statements:
+        yield statement
 
 
-def translate_req_to_module_names(requirement_name):
-    provides = set()
-
-    def is_module_folder(filepath):
-        return bool(filepath) and \
-            '/' not in filepath and \
-            '.egg-info' not in filepath and \
-            '.dist-info' not in filepath and \
-            '__pycache__' not in filepath
-
-    def is_top_level_file(filepath):
-        return bool(filepath) and \
-            '/' not in filepath and \
-            filepath.endswith('.py')
-
-    for result in search_packages_info([requirement_name]):
-        if 'files' not in result or not result['files']:
-            # Assume that only one module is installed in this case
+def _requirement_name(requirement_string):
+    # Find the name of a requirement given as a URL or path from its `#egg=`
+    # fragment, as pip does
+    if not RE_REQUIREMENT_URL.match(requirement_string):
+        return None
+    match = RE_EGG_FRAGMENT.search(requirement_string)
+    if match is None:
+        raise ValueError('A requirement lacks a name (e.g. no `#egg` url)')
+    return match.group(1)
+
+
+def _requirements_file_lines(filename):
+    # Yield logical lines, having joined continuations and removed comments,
+    # and the number of the physical line on which each begins
+    with io.open(filename, encoding='utf8') as fh:
+        lines = []
+        lineno = None
+        for physical_lineno, line in enumerate(fh, 1):
+            if lineno is None:
+                lineno = physical_lineno
+            line = line.rstrip('\r\n')
+            if line.endswith('\\'):
+                lines.append(line[:-1])
+                continue
+            lines.append(line)
+            line = RE_REQUIREMENT_COMMENT.sub('', ' '.join(lines))
+            line = RE_ENVIRONMENT_VARIABLE.sub(
+                lambda match: os.environ.get(match.group(1), match.group(0)),
+                line).strip()
+            if line:
+                yield line, lineno
+            lines = []
+            lineno = None
+        if lines:
+            line = RE_REQUIREMENT_COMMENT.sub('', ' '.join(lines)).strip()
+            if line:
+                yield line, lineno
+
+
+def _parse_requirement(line, filename, lineno):
+    # Separate options (e.g. `--hash`) from the requirement that they follow
+    tokens = line.split()
+    for i, token in enumerate(tokens):
+        if token.startswith('-'):
+            tokens = tokens[:i]
+            break
+    requirement_string = ' '.join(tokens)
+    name = _requirement_name(requirement_string)
+    import pkg_resources
+    try:
+        requirement = pkg_resources.Requirement.parse(
+            requirement_string if name is None else name)
+    except ValueError:
+        raise ValueError('Invalid requirement %r (%s, line %d)' %
+                         (requirement_string, filename, lineno))
+    return Requirement(requirement.project_name, requirement.specifier,
+                       tuple(sorted(requirement.extras)), requirement.marker,
+                       False, filename, lineno)
+
+
+def _parse_requirements_file(filename, constraint, including):
+    filename = os.path.realpath(filename)
+    if filename in including:
+        raise ValueError('Cannot parse %s: it includes itself' % filename)
+    # Files included more than once (e.g. by several requirements files) are
+    # parsed only once unless they are modified
+    file_stat = os.stat(filename)
+    key = (filename, file_stat.st_mtime, file_stat.st_size)
+    requirements = _REQUIREMENTS_FILES.get(key)
+    if requirements is None:
+        requirements = []
+        for requirement in _stream_requirements_file(
+                filename, including | set([filename])):
+            requirements.append(requirement)
+            yield requirement._replace(
+                constraint=constraint or requirement.constraint)
+        _REQUIREMENTS_FILES[key] = tuple(requirements)
+    else:
+        for requirement in requirements:
+            yield requirement._replace(
+                constraint=constraint or requirement.constraint)
+
+
+def _stream_requirements_file(filename, including):
+    for line, lineno in _requirements_file_lines(filename):
+        if not line.startswith('-'):
+            yield _parse_requirement(line, filename, lineno)
             continue
-        # Handle modules that are installed as folders in site-packages
-        folders = [os.path.dirname(filepath) for filepath in result['files']]
-        folders = filter(is_module_folder, folders)
-        provides |= set(folders)
-        # Handle modules that are installed as .py files in site-packages
-        top_level_files = filter(is_top_level_file, result['files'])
-        provides |= set([os.path.splitext(filename)[0]
-                         for filename in top_level_files])
+        option, value = RE_REQUIREMENT_OPTION.match(line).groups()
+        option = REQUIREMENT_OPTIONS.get(option)
+        if option == 'editable':
+            name = _requirement_name(value) or \
+                _parse_requirement(value, filename, lineno).name
+            raise ValueError(
+                'Cannot parse %s: editable projects unsupported' % name)
+        elif option is not None:
+            if RE_REQUIREMENT_URL.match(value) and '://' in value:
+                raise ValueError('Cannot parse %s: remote requirements files '
+                                 'unsupported' % value)
+            # Included files are relative to the file including them
+            included = os.path.join(os.path.dirname(filename),
+                                    os.path.expanduser(value.strip()))
+            for requirement in _parse_requirements_file(
+                    included, option == 'constraint', including):
+                yield requirement
+        # Other options (e.g. `--index-url`) do not affect requirements
 
+
+def parse_requirements(filename):
+    """
+    Parse a pip requirements file, including any files that it includes using
+    `-r` or `-c`; requirements are yielded as they are read.
+    """
+    return _parse_requirements_file(filename, False, frozenset())
+
+
+def _canonical_name(name):
+    # Normalize a project name as per PEP 503
+    return RE_NAME_SEPARATORS.sub('-', name).lower()
+
+
+def _distribution_files(distribution):
+    # Yield '/' separated paths of installed files relative to site-packages
+    if distribution.has_metadata('RECORD'):
+        for line in distribution.get_metadata_lines('RECORD'):
+            yield line.split(',')[0]
+    elif distribution.has_metadata('installed-files.txt'):
+        for line in distribution.get_metadata_lines('installed-files.txt'):
+            filepath = os.path.relpath(
+                os.path.join(distribution.egg_info, line),
+                distribution.location)
+            yield filepath.replace(os.sep, '/')
+
+
+def _distribution_modules(distribution):
+    # Prefer the top level modules declared by a distribution, falling back
+    # to the modules that are apparent from its installed files
+    if distribution.has_metadata('top_level.txt'):
+        return set(
+            module for module in
+            distribution.get_metadata_lines('top_level.txt')
+            if '/' not in module)
+    modules = set()
+    for filepath in _distribution_files(distribution):
+        folder, separator, _ = filepath.partition('/')
+        if separator:
+            # Handle modules that are installed as folders in site-packages,
+            # skipping metadata (e.g. `.dist-info`) and other folders that
+            # cannot be imported
+            if folder and '.' not in folder and folder != '__pycache__':
+                modules.add(folder)
+        elif filepath.endswith(MODULE_EXTENSIONS):
+            # Handle modules that are installed as files in site-packages
+            modules.add(filepath.split('.')[0])
+    return modules
+
+
+def _distribution_paths_stamp():
+    # Installing or uninstalling a distribution changes the modification time
+    # of the directory on sys.path (e.g. site-packages) it is installed in
+    stamp = []
+    for path in sys.path:
+        try:
+            stamp.append(os.stat(path or os.curdir).st_mtime)
+        except OSError:
+            stamp.append(None)
+    return stamp
+
+
+def distribution_module_index():
+    # Map the canonical name of every installed distribution to the modules
+    # it provides, building this index only once per process
+    global _DISTRIBUTION_MODULE_INDEX, _DISTRIBUTION_PATHS_STAMP
+    if _DISTRIBUTION_MODULE_INDEX is None:
+        # Import pkg_resources only when needed as it scans all installed
+        # distributions when imported
+        import pkg_resources
+        stamp = _distribution_paths_stamp()
+        # Scan distributions again if the index is being rebuilt
+        working_set = pkg_resources.working_set \
+            if _DISTRIBUTION_PATHS_STAMP is None else \
+            pkg_resources.WorkingSet()
+        index = {}
+        for distribution in working_set:
+            index.setdefault(_canonical_name(distribution.project_name),
+                             set()).update(
+                _distribution_modules(distribution))
+        _DISTRIBUTION_MODULE_INDEX = index
+        _DISTRIBUTION_PATHS_STAMP = stamp
+    return _DISTRIBUTION_MODULE_INDEX
+
+
+def refresh_distribution_module_index():
+    """
+    Rebuild the index of installed distributions, and forget the modules
+    found importable, if distributions have been installed or uninstalled
+    since it was built; return whether it was rebuilt.
+    """
+    global _DISTRIBUTION_MODULE_INDEX, _ALL_MODULES
+    if _DISTRIBUTION_MODULE_INDEX is not None and \
+            _distribution_paths_stamp() == _DISTRIBUTION_PATHS_STAMP:
+        return False
+    _DISTRIBUTION_MODULE_INDEX = None
+    _ALL_MODULES = None
+    distribution_module_index()
+    return True
+
+
+def _is_importable_module(module_name):
+    global _ALL_MODULES
+    if module_name in STDLIB_MODULES:
+        return True
+    if _ALL_MODULES is None:
+        _ALL_MODULES = set(m[1] for m in pkgutil.iter_modules()) | \
+            STDLIB_MODULES
+    return module_name in _ALL_MODULES
+
+
+def translate_req_to_module_names(requirement_name):
+    provides = distribution_module_index().get(
+        _canonical_name(requirement_name))
     if provides:
-        return provides
+        return set(provides)
     else:
         module_name = requirement_name.split('.')[0]
-        if module_name not in ALL_MODULES:
+        if not _is_importable_module(module_name):
             LOGGER.warning("Cannot find install location of '%s'; please \
 install this package for more accurate name resolution", requirement_name)
-        return provides if provides else set([requirement_name])
+        return set([requirement_name])
@@ -0,0 +1,111 @@
+# Copyright (c) 2016-2017 Chris Fournier. All rights reserved.
+# Use of this source code is governed by a MIT-style license that can be found
+# in the LICENSE file.
+from __future__ import unicode_literals
+
+import os
+
+from collections import namedtuple
+
+from configparser import ConfigParser
+
+from important.parse import _walk_files, Exclusions, RE_GLOB
+
+
+# Name of the files that configure projects
+CONFIG_FILENAME = 'setup.cfg'
+
+Project = namedtuple('Project', ['name', 'directory', 'sourcecode',
+                                 'exclusions', 'requirements', 'constraints',
+                                 'ignore', 'ignorefile'])
+
+
+def read_project(config_path, directory):
+    """
+    Read the project configured by the `[important]` section of a
+    `setup.cfg` file, if any, whose paths are relative to the file and whose
+    name is its directory relative to `directory`.
+    """
+    config = ConfigParser()
+    config.read(config_path)
+    if not config.has_section('important'):
+        return None
+    project_directory = os.path.dirname(os.path.realpath(config_path))
+
+    def values(key):
+        if not config.has_option('important', key):
+            return []
+        return config.get('important', key).split()
+
+    def paths(key):
+        return [os.path.join(project_directory, path) for path in values(key)]
+
+    sourcecode = os.path.realpath(os.path.join(
+        project_directory, config.get('important', 'sourcecode',
+                                      fallback=os.curdir)))
+    # As on the command line, exclusions that are not globs are paths
+    exclusions = [exclusion if RE_GLOB.search(exclusion)
+                  else os.path.join(project_directory, exclusion)
+                  for exclusion in values('exclude')]
+    return Project(
+        os.path.relpath(project_directory, directory).replace(os.sep, '/'),
+        project_directory, sourcecode, Exclusions(exclusions),
+        paths('requirements'), paths('constraints'), values('ignore'),
+        paths('ignorefile'))
+
+
+def discover_projects(directory, exclusions):
+    """
+    Walk `directory` once, returning the projects configured within it and
+    the paths of the Python files found.
+    """
+    directory = os.path.realpath(directory)
+    config_files = {CONFIG_FILENAME: []}
+    filepaths = list(_walk_files(directory, exclusions,
+                                 other_files=config_files))
+    projects = []
+    for config_path in config_files[CONFIG_FILENAME]:
+        project = read_project(config_path, directory)
+        if project is not None:
+            projects.append(project)
+    return sorted(projects, key=lambda project: project.name), filepaths
+
+
+def attribute_imports(imports, directory, projects):
+    """
+    Yield (project, import) for the imports parsed from files within
+    `directory` that are owned by a project: the innermost project within
+    whose directory the file is, if the file is within its source code and
+    not excluded by it.
+    """
+    directory = os.path.realpath(directory)
+    project_directories = dict((project.directory, project)
+                               for project in projects)
+    owners = {}
+
+    def owner(filepath):
+        file_directory = os.path.dirname(filepath)
+        if file_directory not in owners:
+            path = file_directory
+            while path not in project_directories:
+                parent = os.path.dirname(path)
+                if parent == path:
+                    break
+                path = parent
+            owners[file_directory] = project_directories.get(path)
+        project = owners[file_directory]
+        if project is None or (
+                filepath != project.sourcecode and
+                not filepath.startswith(project.sourcecode + os.sep)) or (
+                project.exclusions and
+                project.exclusions.excludes(filepath, project.sourcecode)):
+            return None
+        return project
+
+    filename = project = None
+    for import_statement in imports:
+        if import_statement.filename != filename:
+            filename = import_statement.filename
+            project = owner(os.path.join(directory, filename))
+        if project is not None:
+            yield project, import_statement
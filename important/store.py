@@ -0,0 +1,95 @@
+# Copyright (c) 2016-2017 Chris Fournier. All rights reserved.
+# Use of this source code is governed by a MIT-style license that can be found
+# in the LICENSE file.
+from __future__ import unicode_literals
+
+from array import array
+
+from important.parse import Import
+
+
+# Type code of the columns (str() as Python 2 requires a byte string)
+COLUMN_TYPECODE = str('i')
+
+
+class _InternTable(object):
+    # Values stored once and referred to by their index
+
+    def __init__(self):
+        self.values = []
+        self.ids = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def intern(self, value):
+        value_id = self.ids.get(value)
+        if value_id is None:
+            value_id = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return value_id
+
+
+class ImportStore(object):
+    """
+    Compact store of imports, which keeps each module and filename once and
+    the imports themselves as columns of their module and filename ids, line
+    numbers and column offsets; iterating yields Import records.
+    """
+
+    def __init__(self, imports=()):
+        self.modules = _InternTable()
+        self.filenames = _InternTable()
+        self.module_ids = array(COLUMN_TYPECODE)
+        self.filename_ids = array(COLUMN_TYPECODE)
+        self.linenos = array(COLUMN_TYPECODE)
+        self.col_offsets = array(COLUMN_TYPECODE)
+        self.extend(imports)
+
+    def __len__(self):
+        return len(self.module_ids)
+
+    def __iter__(self):
+        modules = self.modules.values
+        filenames = self.filenames.values
+        for module_id, filename_id, lineno, col_offset in zip(
+                self.module_ids, self.filename_ids, self.linenos,
+                self.col_offsets):
+            yield Import(modules[module_id], filenames[filename_id], lineno,
+                         col_offset)
+
+    def append(self, statement):
+        self.module_ids.append(self.modules.intern(statement.module))
+        self.filename_ids.append(self.filenames.intern(statement.filename))
+        self.linenos.append(statement.lineno)
+        self.col_offsets.append(statement.col_offset)
+
+    def extend(self, imports):
+        for statement in imports:
+            self.append(statement)
+
+    def remove(self, filenames):
+        """
+        Remove the imports found in the given files, returning the number of
+        imports removed.
+        """
+        filename_ids = set(self.filenames.ids[filename]
+                           for filename in filenames
+                           if filename in self.filenames.ids)
+        if not filename_ids:
+            return 0
+        columns = (self.module_ids, self.filename_ids, self.linenos,
+                   self.col_offsets)
+        # Compact the columns in place
+        kept = 0
+        for index, filename_id in enumerate(self.filename_ids):
+            if filename_id in filename_ids:
+                continue
+            if kept != index:
+                for column in columns:
+                    column[kept] = column[index]
+            kept += 1
+        removed = len(self) - kept
+        for column in columns:
+            del column[kept:]
+        return removed
@@ -0,0 +1,205 @@
+# Copyright (c) 2016-2017 Chris Fournier. All rights reserved.
+# Use of this source code is governed by a MIT-style license that can be found
+# in the LICENSE file.
+from __future__ import unicode_literals
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+
+from important.parse import _walk_files, Exclusions, scandir
+
+
+# Seconds to wait for further changes after one is seen, so that the many
+# changes made when saving a file (or checking out a branch) are handled once
+DEBOUNCE_INTERVAL = 0.05
+# Seconds between scans for changes when inotify is unavailable
+POLL_INTERVAL = 0.5
+
+# See inotify(7)
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | \
+    IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+EVENT = struct.Struct('iIII')
+
+
+class InotifyWatcher(object):
+    """
+    Watch a directory tree, and the directories of any other files given,
+    for changes using inotify(7).
+    """
+
+    def __init__(self, directory, exclusions=None, filepaths=()):
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, 'inotify is only available on Linux')
+        self.directory = os.path.realpath(directory)
+        self.exclusions = exclusions if isinstance(exclusions, Exclusions) \
+            else Exclusions(exclusions)
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'),
+                                 use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self._watches = {}
+        self._watch_tree(self.directory)
+        for filepath in filepaths:
+            self._watch(os.path.dirname(os.path.realpath(filepath)))
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _watch(self, directory):
+        path = directory.encode(sys.getfilesystemencoding())
+        watch = self._libc.inotify_add_watch(self._fd, path, WATCH_MASK)
+        # Directories may be removed before they are watched
+        if watch >= 0:
+            self._watches[watch] = directory
+
+    def _watch_tree(self, directory):
+        if self.exclusions.excludes(directory, self.directory):
+            return
+        relative_directory = os.path.relpath(directory, self.directory)
+        directories = [(directory, None if relative_directory == os.curdir
+                        else relative_directory.replace(os.sep, '/'))]
+        while directories:
+            directory, relative_directory = directories.pop()
+            self._watch(directory)
+            try:
+                entries = list(scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                relative_path = entry.name if relative_directory is None \
+                    else relative_directory + '/' + entry.name
+                if entry.is_dir(follow_symlinks=False) and \
+                        not self.exclusions.match(entry.path, relative_path):
+                    directories.append((entry.path, relative_path))
+
+    def _read(self, timeout):
+        # Return the paths changed by the events read within `timeout`
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return None
+        data = os.read(self._fd, 64 * 1024)
+        paths = set()
+        offset = 0
+        while offset < len(data):
+            watch, mask, _, length = EVENT.unpack_from(data, offset)
+            offset += EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost; everything may have changed
+                paths.add(self.directory)
+                continue
+            directory = self._watches.get(watch)
+            if mask & IN_IGNORED:
+                self._watches.pop(watch, None)
+            if directory is None:
+                continue
+            path = os.path.join(
+                directory, name.decode(sys.getfilesystemencoding())) \
+                if name else directory
+            paths.add(path)
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and \
+                    path.startswith(self.directory + os.sep):
+                self._watch_tree(path)
+        return paths
+
+    def wait(self):
+        """
+        Block until changes are made, returning the paths changed.
+        """
+        paths = set()
+        while not paths:
+            paths.update(self._read(None) or ())
+        while True:
+            changed = self._read(DEBOUNCE_INTERVAL)
+            if changed is None:
+                return paths
+            paths.update(changed)
+
+
+class PollingWatcher(object):
+    """
+    Watch a directory tree, and any other files given, for changes by
+    periodically comparing the size, modification time and mode of files.
+    """
+
+    def __init__(self, directory, exclusions=None, filepaths=(),
+                 interval=POLL_INTERVAL):
+        self.directory = os.path.realpath(directory)
+        self.exclusions = exclusions if isinstance(exclusions, Exclusions) \
+            else Exclusions(exclusions)
+        self.filepaths = [os.path.realpath(path) for path in filepaths]
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def close(self):
+        pass
+
+    def _scan(self):
+        snapshot = {}
+        for filepath in self.filepaths + list(
+                _walk_files(self.directory, self.exclusions)):
+            try:
+                file_stat = os.stat(filepath)
+            except OSError:
+                continue
+            snapshot[filepath] = (file_stat.st_size, file_stat.st_mtime,
+                                  file_stat.st_mode)
+        return snapshot
+
+    def wait(self):
+        """
+        Block until changes are made, returning the paths changed.
+        """
+        while True:
+            time.sleep(self.interval)
+            snapshot = self._scan()
+            paths = set(
+                path for path in set(snapshot) | set(self._snapshot)
+                if snapshot.get(path) != self._snapshot.get(path))
+            self._snapshot = snapshot
+            if paths:
+                return paths
+
+
+def _changes(watcher):
+    try:
+        while True:
+            yield watcher.wait()
+    finally:
+        watcher.close()
+
+
+def watch(directory, exclusions=None, filepaths=()):
+    """
+    Start watching a directory, and any other files given, returning an
+    iterator of the paths changed each time that changes are made.
+    """
+    try:
+        watcher = InotifyWatcher(directory, exclusions, filepaths)
+    except (OSError, AttributeError, TypeError):
+        # inotify is unavailable (e.g. not on Linux)
+        watcher = PollingWatcher(directory, exclusions, filepaths)
+    return _changes(watcher)
@@ -52,8 +52,8 @@ setup(
         ],
     },
     install_requires=[
-        'pip>=8',
         'click>=5',
         'setuptools>=0.9',
+        'scandir; python_version < "3.5"',
     ],
 )
@@ -0,0 +1,63 @@
+# Copyright (c) 2016-2017 Chris Fournier. All rights reserved.
+# Use of this source code is governed by a MIT-style license that can be found
+# in the LICENSE file.
+from __future__ import unicode_literals
+
+import os
+import pytest
+import tarfile
+import zipfile
+
+from important.archive import is_archive, parse_archive_imports
+from important.parse import parse_dir_imports
+
+
+def source_files(directory):
+    for root, _, filenames in os.walk(directory):
+        for filename in filenames:
+            filepath = os.path.join(root, filename)
+            yield filepath, os.path.relpath(filepath, directory).replace(
+                os.sep, '/')
+
+
+@pytest.fixture(params=['wheel.whl', 'sdist.tar.gz'])
+def archive(request, tmpdir, python_source_dir, exclusions):
+    archive = str(tmpdir.join(request.param))
+    if archive.endswith('.whl'):
+        with zipfile.ZipFile(archive, 'w') as archive_file:
+            archive_file.writestr('package/', '')
+            for filepath, name in source_files(python_source_dir):
+                archive_file.write(filepath, name)
+    else:
+        with tarfile.open(archive, 'w:gz') as archive_file:
+            for filepath, name in source_files(python_source_dir):
+                archive_file.add(filepath, './' + name)
+    return archive
+
+
+def test_is_archive():
+    assert is_archive('package-1.0-py3-none-any.whl')
+    assert is_archive('package-1.0.tar.gz')
+    assert is_archive('app.pyz')
+    assert not is_archive('package.py')
+
+
+def test_archive_imports(archive, python_source_dir, exclusions):
+    assert sorted(parse_archive_imports(archive)) == \
+        sorted(parse_dir_imports(python_source_dir))
+
+    # Exclusions are matched against paths within the archive
+    assert sorted(parse_archive_imports(
+        archive, ['excluded.py', 'excluded/**'])) == \
+        sorted(parse_dir_imports(python_source_dir, exclusions))
+    assert sorted(parse_archive_imports(archive, ['**/excluded'])) == \
+        sorted(parse_dir_imports(python_source_dir, exclusions[1:]))
+    assert list(parse_archive_imports(archive, [archive])) == []
+
+
+def test_archive_imports_invalid(tmpdir):
+    archive = tmpdir.join('invalid.tar.gz')
+    archive.write('not an archive')
+    with pytest.raises(ValueError) as excinfo:
+        list(parse_archive_imports(str(archive)))
+    assert str(excinfo.value).startswith('Cannot read')
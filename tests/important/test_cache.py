@@ -0,0 +1,112 @@
+# Copyright (c) 2016-2017 Chris Fournier. All rights reserved.
+# Use of this source code is governed by a MIT-style license that can be found
+# in the LICENSE file.
+from __future__ import unicode_literals
+
+import os
+import pytest
+
+from important.cache import ImportCache
+from important.parse import _source_imports, parse_dir_imports, \
+    parse_file_imports
+
+try:
+    from unittest.mock import Mock
+except:
+    from mock import Mock
+
+
+@pytest.fixture
+def cache(tmpdir):
+    return ImportCache(str(tmpdir.join('cache')))
+
+
+@pytest.fixture
+def parse():
+    return Mock(side_effect=_source_imports)
+
+
+def test_cache_statements(cache, parse, python_source_file, python_imports):
+    assert cache.statements(python_source_file, parse) == python_imports
+    assert parse.call_count == 1
+
+    # Unchanged files are never parsed again
+    assert cache.statements(python_source_file, parse) == python_imports
+    assert parse.call_count == 1
+
+
+def test_cache_statements_touched(cache, parse, python_source_file,
+                                  python_imports):
+    cache.statements(python_source_file, parse)
+
+    # A new modification time with the same content is rekeyed, not parsed
+    stat = os.stat(python_source_file)
+    os.utime(python_source_file, (stat.st_atime, stat.st_mtime + 10))
+    assert cache.statements(python_source_file, parse) == python_imports
+    assert parse.call_count == 1
+
+
+def test_cache_statements_modified(cache, parse, python_source_file,
+                                   python_imports):
+    cache.statements(python_source_file, parse)
+
+    with open(python_source_file, 'a') as fh:
+        fh.write('\nimport abc')
+    assert cache.statements(python_source_file, parse) == \
+        python_imports + [('abc', 24, 0)]
+    assert parse.call_count == 2
+
+
+def test_cache_statements_parser(tmpdir, parse, python_source_file,
+                                 python_imports):
+    directory = str(tmpdir.join('cache'))
+    ImportCache(directory, 'fast').statements(python_source_file, parse)
+
+    # Entries of one parser are never served to another
+    cache = ImportCache(directory, 'ast')
+    assert cache.statements(python_source_file, parse) == python_imports
+    assert parse.call_count == 2
+    assert cache.statements(python_source_file, parse) == python_imports
+    assert parse.call_count == 2
+
+
+def test_cache_statements_syntax_error(cache, parse, python_source_file):
+    with open(python_source_file, 'a') as fh:
+        fh.write('not a valid Python statement')
+
+    with pytest.raises(SyntaxError) as first:
+        cache.statements(python_source_file, parse)
+    with pytest.raises(SyntaxError) as second:
+        cache.statements(python_source_file, parse)
+    assert str(first.value) == str(second.value)
+    assert second.value.filename == first.value.filename
+    assert parse.call_count == 1
+
+
+def test_cache_unwritable(tmpdir, parse, python_source_file,
+                          python_imports):
+    # Entries that cannot be written are parsed again rather than cached
+    tmpdir.join('file').write('')
+    cache = ImportCache(str(tmpdir.join('file', 'cache')))
+    assert cache.statements(python_source_file, parse) == python_imports
+    assert cache.statements(python_source_file, parse) == python_imports
+    assert parse.call_count == 2
+    assert cache.evict(force=True) == 0
+
+
+def test_cache_evict(cache, parse, python_source_file):
+    cache.statements(python_source_file, parse)
+    assert cache.evict(force=True) == 0
+
+    os.remove(python_source_file)
+    assert cache.evict(force=True) == 1
+
+
+def test_cache_parse_imports(cache, python_source_dir, python_source_file,
+                             exclusions):
+    assert list(parse_file_imports(python_source_file, cache=cache)) == \
+        list(parse_file_imports(python_source_file))
+    for _ in range(2):
+        assert list(parse_dir_imports(python_source_dir, exclusions,
+                                      cache=cache)) == \
+            list(parse_dir_imports(python_source_dir, exclusions))
@@ -5,8 +5,12 @@ from __future__ import unicode_literals
 
 from important.parse import parse_requirements
 from important.check import check_unused_requirements, \
-    frequency_count_imports, check_import_frequencies
-from pip._vendor.packaging.specifiers import SpecifierSet
+    frequency_count_imports, check_import_frequencies, FailFast, \
+    FrequencyTrie, ImportSummary, SortedSpool
+from important.parse import Import
+from pkg_resources import Requirement
+
+SpecifierSet = type(Requirement.parse('requirement').specifier)
 
 
 def test_unused_requirements(python_file_imports,
@@ -55,3 +59,137 @@ def test_check_import_frequencies(
         'os.path': (SpecifierSet('<6'), 6),
         package_name: (SpecifierSet('==0'), 3),
     }
+
+
+def test_frequency_trie():
+    imports = [Import('google.protobuf.message', 'a.py', 1, 0),
+               Import('six', 'legacy/a.py', 1, 0),
+               Import('six.moves', 'legacy/old/b.py', 1, 0),
+               Import('six', 'services/c.py', 1, 0)]
+    trie = FrequencyTrie(imports)
+    assert trie.scope() == {'google': 1, 'google.protobuf': 1,
+                            'google.protobuf.message': 1, 'six': 3,
+                            'six.moves': 1}
+    assert trie.scope('legacy') == {'six': 2, 'six.moves': 1}
+    assert trie.scope('legacy/old/') == trie.scope('./legacy/old') == \
+        {'six': 1, 'six.moves': 1}
+    assert trie.scope('services') == {'six': 1}
+    assert trie.scope('missing') == {}
+
+    # Only the scopes given (and their parents) are counted
+    trie = FrequencyTrie(imports, scopes=['legacy/old'])
+    assert trie.scope() == FrequencyTrie(imports).scope()
+    assert trie.scope('legacy') == {'six': 2, 'six.moves': 1}
+    assert trie.scope('legacy/old') == {'six': 1, 'six.moves': 1}
+    assert trie.scope('services') == {}
+
+
+def test_check_import_frequencies_scoped(tmpdir):
+    imports = [Import('google.protobuf.message', 'a.py', 1, 0),
+               Import('six', 'legacy/a.py', 1, 0),
+               Import('six', 'services/c.py', 1, 0)]
+    constraints_file = tmpdir.join('constraints.txt')
+    constraints_file.write('six==0\ngoogle.protobuf==0\n')
+    constraints = list(parse_requirements(str(constraints_file)))
+    assert check_import_frequencies(imports, constraints) == {
+        'six': (SpecifierSet('==0'), 2),
+        'google.protobuf': (SpecifierSet('==0'), 1),
+    }
+    summary = ImportSummary(imports, scopes=['services', 'other'])
+    assert check_import_frequencies(summary, constraints, 'services') == \
+        check_import_frequencies(imports, constraints, 'services') == \
+        {'six': (SpecifierSet('==0'), 1)}
+    assert check_import_frequencies(summary, constraints, 'other') == {}
+
+
+def test_import_summary(python_file_imports, python_files_parsed,
+                        constraints_file_package_disallowed,
+                        requirements_file_one_unused):
+    # Imports repeated within a file are counted once
+    summary = ImportSummary(python_file_imports + python_file_imports[-1:])
+    assert summary.imports == len(python_file_imports)
+    assert summary.files == len(python_files_parsed)
+    assert summary.module_frequencies == \
+        frequency_count_imports(python_file_imports)
+    assert summary.filenames is None and summary.statements is None
+
+    requirements = list(parse_requirements(requirements_file_one_unused))
+    assert check_unused_requirements(summary, requirements) == \
+        check_unused_requirements(python_file_imports, requirements)
+    constraints = list(parse_requirements(
+        constraints_file_package_disallowed))
+    assert check_import_frequencies(summary, constraints) == \
+        check_import_frequencies(python_file_imports, constraints)
+
+
+def test_fail_fast_requirements(python_file_imports,
+                                requirements_file_one_unused):
+    requirements = list(parse_requirements(requirements_file_one_unused))
+    fail_fast = FailFast(ImportSummary(), requirements, [])
+    assert not any(fail_fast.add(statement)
+                   for statement in python_file_imports)
+
+    # Once every requirement is imported, none can become unused
+    fail_fast = FailFast(ImportSummary(), [
+        requirement for requirement in requirements
+        if requirement.name != 'unused'], [])
+    assert not fail_fast.decided
+    decided = [fail_fast.add(statement) for statement in python_file_imports]
+    assert decided.index(True) < len(python_file_imports) / 3
+    assert not fail_fast.violated
+
+
+def test_fail_fast_constraints(python_file_imports, package_name,
+                               constraints_file_package_disallowed,
+                               requirements_file):
+    constraints = list(parse_requirements(
+        constraints_file_package_disallowed))
+    summary = ImportSummary()
+    fail_fast = FailFast(summary, parse_requirements(requirements_file),
+                         constraints)
+    # Exceeding an upper bound decides the outcome, unlike a lower bound
+    for statement in python_file_imports:
+        if fail_fast.add(statement):
+            break
+    assert summary.files == 1
+    assert [requirement.name for _, requirement in fail_fast.violated] == \
+        [package_name]
+    violated_constraints, scoped_constraints = \
+        fail_fast.violated_constraints()
+    assert check_import_frequencies(summary, violated_constraints) == {
+        package_name: (SpecifierSet('==0'), 1)}
+    assert scoped_constraints == []
+
+    # As is exceeding an upper bound within a scope
+    fail_fast = FailFast(ImportSummary(scopes=['subdir']), [], [],
+                         [('subdir', constraints)])
+    for statement in python_file_imports:
+        if fail_fast.add(statement):
+            break
+    assert statement.filename == 'subdir/test3.py'
+    assert [(scope, requirement.name)
+            for scope, requirement in fail_fast.violated] == \
+        [('subdir', package_name)]
+    assert fail_fast.violated_constraints()[1] == [
+        ('subdir', [requirement for _, requirement in fail_fast.violated])]
+
+
+def test_import_summary_detailed(python_file_imports, python_files_parsed):
+    summary = ImportSummary(reversed(python_file_imports), detailed=True)
+    assert list(summary.filenames) == \
+        [(filename,) for filename in sorted(python_files_parsed)]
+    assert list(summary.statements) == \
+        [tuple(statement) for statement in sorted(python_file_imports)]
+    summary.close()
+
+
+def test_sorted_spool():
+    spool = SortedSpool(run_size=3)
+    records = [Import('os', 'b.py', 1, 0), Import('os.path', 'a.py', 2, 0),
+               Import('os', 'a.py', 10, 4), Import('abc', 'c.py', 1, 0),
+               Import('os', 'a.py', 10, 4), Import('os', 'a.py', 9, 0),
+               Import('sys', 'a.py', 1, 0)]
+    for record in records:
+        spool.add(tuple(record))
+    assert list(spool) == sorted(set(tuple(record) for record in records))
+    spool.close()
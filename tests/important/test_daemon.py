@@ -0,0 +1,135 @@
+# Copyright (c) 2016-2017 Chris Fournier. All rights reserved.
+# Use of this source code is governed by a MIT-style license that can be found
+# in the LICENSE file.
+from __future__ import unicode_literals
+
+import os
+import pytest
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+
+from important.daemon import default_socket_path, query, serve
+
+
+@pytest.fixture
+def socket_path():
+    # Make our own temp dir because tmpdir's are too long to be unix sockets
+    tempdir = tempfile.mkdtemp()
+    yield os.path.join(tempdir, 's')
+    shutil.rmtree(tempdir)
+
+
+@pytest.fixture
+def daemon(socket_path):
+    listening = threading.Event()
+    thread = threading.Thread(target=serve, args=(
+        socket_path, lambda request: {'echo': request}, listening.set))
+    thread.daemon = True
+    thread.start()
+    assert listening.wait(5)
+    return thread
+
+
+def test_default_socket_path(tmpdir):
+    assert default_socket_path(str(tmpdir)) == \
+        default_socket_path(str(tmpdir.join('.')))
+    assert default_socket_path(str(tmpdir)) != \
+        default_socket_path(str(tmpdir.mkdir('subdir')))
+    assert len(default_socket_path(str(tmpdir))) < 100
+
+
+def test_default_socket_path_prefix(tmpdir, monkeypatch):
+    # Daemons of other Python environments are not queried
+    path = default_socket_path(str(tmpdir))
+    monkeypatch.setattr(sys, 'prefix', str(tmpdir.join('venv')))
+    assert default_socket_path(str(tmpdir)) != path
+
+
+def test_default_socket_path_private(tmpdir, socket_path, monkeypatch):
+    runtime = os.path.dirname(socket_path)
+    monkeypatch.setenv('XDG_RUNTIME_DIR', runtime)
+    assert os.path.dirname(default_socket_path(str(tmpdir))) == \
+        os.path.join(runtime, 'important')
+
+    # Directories in the temporary directory must only be accessible to the
+    # current user
+    monkeypatch.delenv('XDG_RUNTIME_DIR')
+    monkeypatch.setattr(tempfile, 'gettempdir', lambda: runtime)
+    directory = os.path.join(runtime, 'important-%d' % os.getuid())
+    assert os.path.dirname(default_socket_path(str(tmpdir))) == directory
+    os.mkdir(directory, 0o700)
+    assert os.path.dirname(default_socket_path(str(tmpdir))) == directory
+    os.chmod(directory, 0o777)
+    with pytest.raises(ValueError) as excinfo:
+        default_socket_path(str(tmpdir))
+    assert str(excinfo.value) == \
+        '%s is not a directory private to the current user' % directory
+
+
+def test_query(daemon, socket_path):
+    request = {'sourcecode': '/path/to/source', 'verbose': 1}
+    assert query(socket_path, request) == {'echo': request}
+    assert query(socket_path, {'large': 'x' * 1024 * 1024}) == \
+        {'echo': {'large': 'x' * 1024 * 1024}}
+    assert os.stat(socket_path).st_mode & 0o777 == 0o600
+
+
+def test_query_without_daemon(socket_path):
+    assert query(socket_path, {}) is None
+
+    # Sockets of daemons that have exited are not listened to
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socket_path)
+    stale.close()
+    assert query(socket_path, {}) is None
+
+
+def test_query_not_socket(socket_path):
+    with open(socket_path, 'w') as fh:
+        fh.write('{}\n')
+    assert query(socket_path, {}) is None
+
+
+def test_serve_not_socket(socket_path):
+    with open(socket_path, 'w') as fh:
+        fh.write('')
+    with pytest.raises(ValueError) as excinfo:
+        serve(socket_path, lambda request: request)
+    assert str(excinfo.value) == \
+        '%s exists and is not a socket' % socket_path
+    assert os.path.isfile(socket_path)
+
+
+def test_serve_creates_directory(socket_path):
+    socket_path = os.path.join(os.path.dirname(socket_path), 'd', 's')
+    listening = threading.Event()
+    thread = threading.Thread(target=serve, args=(
+        socket_path, lambda request: request, listening.set))
+    thread.daemon = True
+    thread.start()
+    assert listening.wait(5)
+    assert os.stat(os.path.dirname(socket_path)).st_mode & 0o777 == 0o700
+    assert query(socket_path, {'a': 1}) == {'a': 1}
+
+
+def test_serve_already_listening(daemon, socket_path):
+    with pytest.raises(ValueError) as excinfo:
+        serve(socket_path, lambda request: request)
+    assert str(excinfo.value) == \
+        'A daemon is already listening on %s' % socket_path
+
+
+def test_serve_stale_socket(socket_path):
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socket_path)
+    stale.close()
+    listening = threading.Event()
+    thread = threading.Thread(target=serve, args=(
+        socket_path, lambda request: request, listening.set))
+    thread.daemon = True
+    thread.start()
+    assert listening.wait(5)
+    assert query(socket_path, {'a': 1}) == {'a': 1}
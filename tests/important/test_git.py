@@ -0,0 +1,139 @@
+# Copyright (c) 2016-2017 Chris Fournier. All rights reserved.
+# Use of this source code is governed by a MIT-style license that can be found
+# in the LICENSE file.
+from __future__ import unicode_literals
+
+import os
+import pytest
+import stat
+import subprocess
+
+from collections import Counter
+
+from important.git import parse_dir_imports_since, changed_files, \
+    tracked_files, resolve_commit, git_source_files, parse_git_files_imports
+from important.parse import parse_dir_imports
+
+
+def git(directory, *args):
+    subprocess.check_call(
+        ('git', '-c', 'user.name=important', '-c',
+         'user.email=important@example.com') + args,
+        cwd=str(directory), stdout=subprocess.PIPE)
+
+
+@pytest.fixture
+def repository(tmpdir):
+    repository = tmpdir.mkdir('repository')
+    repository.join('a.py').write('import os\nimport sys\n')
+    repository.join('b.py').write('import json\n')
+    repository.mkdir('package').join('c.py').write('from os import path\n')
+    try:
+        git(repository, 'init', '-q')
+    except OSError:
+        pytest.skip('git is not installed')
+    git(repository, 'add', '.')
+    git(repository, 'commit', '-q', '-m', 'Initial commit')
+    return repository
+
+
+@pytest.fixture
+def statistics(mocker):
+    return mocker.patch('important.git.STATISTICS', Counter())
+
+
+def assert_matches_full_scan(repository, since, statistics, unchanged):
+    statistics.clear()
+    assert sorted(parse_dir_imports_since(str(repository), since)) == \
+        sorted(parse_dir_imports(str(repository)))
+    assert statistics['unchanged_since_baseline'] == unchanged
+
+
+def test_git_files(repository):
+    repository.join('a.py').write('import os\n')
+    repository.join('d.py').write('import abc\n')
+    head = resolve_commit(str(repository), 'HEAD')
+    assert changed_files(str(repository), head) == set(['a.py'])
+    assert tracked_files(str(repository)) == \
+        set(['a.py', 'b.py', os.path.join('package', 'c.py')])
+    assert changed_files(str(repository.join('package')), head) == set()
+
+
+def test_git_source_files(repository):
+    script = repository.join('script')
+    script.write('#!/usr/bin/env python\nimport abc\n')
+    binary = repository.join('binary')
+    binary.write_binary(b'\\x7fELF')
+    for path in (script, binary):
+        path.chmod(stat.S_IRWXU)
+    repository.join('.gitignore').write('venv/\n')
+    git(repository, 'add', '.')
+    git(repository, 'commit', '-q', '-m', 'Scripts')
+    repository.join('b.py').remove()
+    repository.join('untracked.py').write('import json\n')
+    repository.mkdir('venv').join('ignored.py').write('import six\n')
+
+    def relative(filepaths):
+        return [os.path.relpath(filepath, str(repository))
+                for filepath in filepaths]
+    # Deleted and ignored files are never listed
+    assert relative(git_source_files(str(repository))) == \
+        ['a.py', os.path.join('package', 'c.py'), 'script']
+    assert relative(git_source_files(str(repository), untracked=True)) == \
+        ['a.py', os.path.join('package', 'c.py'), 'script', 'untracked.py']
+    assert relative(git_source_files(str(repository), ['package/**'],
+                                     untracked=True)) == \
+        ['a.py', 'script', 'untracked.py']
+    assert relative(git_source_files(str(repository.join('package')))) == \
+        [os.path.join('package', 'c.py')]
+
+
+def test_parse_git_files_imports(repository, tmpdir):
+    assert sorted(parse_git_files_imports(str(repository))) == \
+        sorted(parse_dir_imports(str(repository)))
+    with pytest.raises(ValueError):
+        list(parse_git_files_imports(str(tmpdir.mkdir('not-a-repository'))))
+
+
+def test_resolve_commit_invalid(repository):
+    with pytest.raises(ValueError) as excinfo:
+        resolve_commit(str(repository), 'not-a-ref')
+    assert str(excinfo.value).startswith('not-a-ref is not a commit')
+
+
+def test_parse_dir_imports_since(repository, statistics):
+    # Without a baseline, all files are parsed
+    assert_matches_full_scan(repository, 'HEAD', statistics, 0)
+    assert_matches_full_scan(repository, 'HEAD', statistics, 3)
+
+    # Added, modified and deleted files are parsed, whether committed or not
+    repository.join('a.py').write('import os\n')
+    repository.join('d.py').write('import abc\n')
+    repository.join('package', 'c.py').remove()
+    assert_matches_full_scan(repository, 'HEAD', statistics, 1)
+    git(repository, 'add', '.')
+    git(repository, 'commit', '-q', '-m', 'Change')
+    assert_matches_full_scan(repository, 'HEAD~1', statistics, 1)
+    assert_matches_full_scan(repository, 'HEAD', statistics, 3)
+
+
+def test_parse_dir_imports_since_dirty_baseline(repository, statistics):
+    # Files that differed from the baseline's commit are parsed again even
+    # once they no longer differ
+    repository.join('a.py').write('import abc\n')
+    assert_matches_full_scan(repository, 'HEAD', statistics, 0)
+    git(repository, 'checkout', '-q', '--', 'a.py')
+    assert_matches_full_scan(repository, 'HEAD', statistics, 2)
+    assert_matches_full_scan(repository, 'HEAD', statistics, 3)
+
+
+def test_parse_dir_imports_since_cache_dir(repository, tmpdir, statistics):
+    baseline_directory = str(tmpdir.join('cache'))
+    for unchanged in (0, 3):
+        statistics.clear()
+        assert sorted(parse_dir_imports_since(
+            str(repository), 'HEAD',
+            baseline_directory=baseline_directory)) == \
+            sorted(parse_dir_imports(str(repository)))
+        assert statistics['unchanged_since_baseline'] == unchanged
+    assert os.listdir(os.path.join(baseline_directory, 'baselines'))
@@ -0,0 +1,81 @@
+# Copyright (c) 2016-2017 Chris Fournier. All rights reserved.
+# Use of this source code is governed by a MIT-style license that can be found
+# in the LICENSE file.
+from __future__ import unicode_literals
+
+import os
+import shutil
+
+from important.index import ImportIndex
+from important.parse import parse_dir_imports
+
+
+def assert_matches_full_scan(index, exclusions=None):
+    assert sorted(index.imports()) == \
+        sorted(parse_dir_imports(index.directory, exclusions))
+
+
+def test_index_build(python_source_dir, exclusions):
+    index = ImportIndex(python_source_dir, exclusions)
+    assert index.build() == 3
+    assert len(index) == 3
+    assert_matches_full_scan(index, exclusions)
+
+
+def test_index_update(python_source_dir, exclusions):
+    index = ImportIndex(python_source_dir, exclusions)
+    index.build()
+
+    # Modified and created files are parsed again
+    test1 = os.path.join(python_source_dir, 'test1.py')
+    with open(test1, 'w') as fh:
+        fh.write('import abc\n')
+    test5 = os.path.join(python_source_dir, 'test5.py')
+    with open(test5, 'w') as fh:
+        fh.write('import json\n')
+    assert index.update([test1, test5]) == 2
+    assert_matches_full_scan(index, exclusions)
+
+    # Removed files are removed
+    os.remove(test5)
+    assert index.update([test5]) == 1
+    assert_matches_full_scan(index, exclusions)
+
+    # Other files, and files that are excluded or outside of the directory,
+    # are ignored
+    assert index.update([os.path.join(python_source_dir, 'random.txt'),
+                         os.path.join(python_source_dir, 'excluded.py'),
+                         os.path.dirname(python_source_dir)]) == 0
+    assert_matches_full_scan(index, exclusions)
+
+
+def test_index_update_directory(python_source_dir):
+    index = ImportIndex(python_source_dir)
+    index.build()
+
+    # Created or moved directories are scanned again
+    subdir = os.path.join(python_source_dir, 'subdir')
+    moved = os.path.join(python_source_dir, 'moved')
+    shutil.move(subdir, moved)
+    assert index.update([subdir, moved]) == 2
+    assert_matches_full_scan(index)
+
+    shutil.rmtree(moved)
+    assert index.update([moved]) == 1
+    assert_matches_full_scan(index)
+
+
+def test_index_refresh(python_source_dir, exclusions):
+    index = ImportIndex(python_source_dir, exclusions)
+    index.build()
+    assert index.refresh() == 0
+
+    test1 = os.path.join(python_source_dir, 'test1.py')
+    with open(test1, 'a') as fh:
+        fh.write('\nimport abc\n')
+    with open(os.path.join(python_source_dir, 'test5.py'), 'w') as fh:
+        fh.write('import json\n')
+    shutil.rmtree(os.path.join(python_source_dir, 'subdir'))
+    assert index.refresh() == 3
+    assert_matches_full_scan(index, exclusions)
+    assert index.refresh() == 0
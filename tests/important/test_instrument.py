@@ -0,0 +1,56 @@
+# Copyright (c) 2016-2017 Chris Fournier. All rights reserved.
+# Use of this source code is governed by a MIT-style license that can be found
+# in the LICENSE file.
+from __future__ import unicode_literals
+
+import json
+
+from collections import Counter
+
+from important.check import ImportSummary
+from important.instrument import Profile, report_lines, write_report
+from important.parse import Import
+
+
+def test_profile(tmpdir):
+    profile = Profile(trace_memory=True)
+    with profile.phase('scan'):
+        imports = ImportSummary([Import('os', 'a.py', 1, 0),
+                                 Import('sys', 'b.py', 1, 0)])
+    with profile.phase('check'):
+        pass
+    with profile.phase('scan'):
+        other_imports = ImportSummary([Import('os', 'c.py', 1, 0)])
+    statistics = Counter(files_read=2, bytes_read=2048, seconds_parse=0.25,
+                         skipped_prefilter=3, skipped_syntax_error=1)
+    report = profile.report(statistics, [(0.1, 'a.py'), (0.2, 'b.py')],
+                            [imports, other_imports])
+    assert [phase['phase'] for phase in report['phases']] == \
+        ['scan', 'check']
+    assert report['scan'] == {'walk': 0, 'read': 0, 'parse': 0.25}
+    assert report['files']['read'] == 2
+    assert report['files']['skipped_prefilter'] == 3
+    assert report['files']['skipped_syntax_error'] == 1
+    assert (report['imports'], report['files_with_imports']) == (3, 3)
+    assert [slowest_file['filename']
+            for slowest_file in report['slowest_files']] == ['b.py', 'a.py']
+
+    lines = list(report_lines(report))
+    assert lines[0] == 'Profile:'
+    assert 'parse 250ms' in lines[1]
+    assert any(line.startswith('Files: 2 read (2.0KB)') for line in lines)
+    assert any('3 not naming any module checked' in line for line in lines)
+    assert any(line.startswith('Peak memory (main process): ')
+               for line in lines)
+    assert lines[-2:] == ['       200ms b.py', '       100ms a.py']
+
+    report_file = tmpdir.join('profile.json')
+    write_report(report, str(report_file))
+    assert json.loads(report_file.read()) == report
+
+
+def test_profile_untraced():
+    report = Profile().report(Counter(), [], [])
+    assert report['peak_memory_bytes'] is None
+    assert not any(line.startswith('Peak memory')
+                   for line in report_lines(report))
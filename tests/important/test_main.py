@@ -3,14 +3,19 @@
 # in the LICENSE file.
 import codecs
 import important.__main__
+import json
 import os
 import pytest
 import re
 import socket
+import subprocess
+import sys
 import tempfile
+import zipfile
 
 from configparser import ConfigParser
 from click.testing import CliRunner
+from important.daemon import query
 
 
 try:
@@ -532,3 +537,355 @@ Error: Invalid value: could not parse SOURCECODE '%s'; path is either not a '''
         python_socket.close()
         os.remove(socket_file)
         os.rmdir(tempdir)
+
+
+def test_main_profile(requirements_file, python_source_dir, exclusions,
+                      tmpdir):
+    runner = CliRunner()
+    profile_json = str(tmpdir.join('profile.json'))
+    args = ['--requirements', requirements_file, '--exclude', exclusions[0],
+            '--profile', '--profile-json', profile_json, python_source_dir]
+    with tmpdir.as_cwd():
+        result = runner.invoke(important.__main__.check, args)
+    assert result.exit_code == 0
+    assert 'Profile:' in result.output
+    assert 'Slowest files:' in result.output
+    with open(profile_json) as fh:
+        report = json.load(fh)
+    assert [phase['phase'] for phase in report['phases']] == \
+        ['requirements', 'scan', 'resolve', 'check']
+    assert report['files']['read'] == 4
+    assert report['files']['excluded'] == 1
+    assert report['imports'] > 0
+    assert len(report['slowest_files']) == 4
+
+    with tmpdir.as_cwd():
+        result = runner.invoke(important.__main__.check,
+                               ['--profile', '--watch'] + args)
+    assert result.exit_code == 2
+
+
+def test_main_projects(tmpdir):
+    monorepo = tmpdir.mkdir('monorepo')
+    monorepo.join('tool.py').write('import os\n')
+    monorepo.join('requirements.txt').write('six\n')
+    for name, requirements in (('api', 'click\nunused\n'), ('web', 'os\n')):
+        project = monorepo.mkdir(name)
+        project.join('setup.cfg').write(
+            '[important]\nrequirements=requirements.txt\n')
+        project.join('requirements.txt').write(requirements)
+        project.join('%s.py' % name).write('import click\nimport os\n')
+
+    runner = CliRunner()
+    with tmpdir.as_cwd():
+        result = runner.invoke(important.__main__.check,
+                               ['-v', '--projects', str(monorepo)])
+    assert result.exit_code == 1
+    assert result.output.splitlines() == [
+        'api: Parsed 2 imports in 1 files',
+        'web: Parsed 2 imports in 1 files',
+        'Error: Unused requirements or violated constraints found',
+        'api: unused (unused requirement)',
+    ]
+
+    # Requirements given configure SOURCECODE as a project
+    with tmpdir.as_cwd():
+        result = runner.invoke(important.__main__.check, [
+            '-v', '--projects', '--requirements',
+            str(monorepo.join('requirements.txt')), str(monorepo.join('web'))])
+    assert result.exit_code == 1
+    assert result.output.splitlines() == [
+        '.: Parsed 2 imports in 1 files',
+        'Error: Unused requirements or violated constraints found',
+        '.: six (unused requirement)',
+    ]
+
+    with tmpdir.as_cwd():
+        result = runner.invoke(important.__main__.check,
+                               ['--projects', str(tmpdir.mkdir('empty'))])
+    assert result.exit_code == 2
+    assert 'no projects found' in result.output
+
+
+def test_main_scoped_constraints(tmpdir):
+    sourcecode = tmpdir.mkdir('sourcecode')
+    sourcecode.join('tool.py').write('import six\n')
+    legacy = sourcecode.mkdir('legacy')
+    legacy.join('old.py').write('import six\nimport six.moves\n')
+    services = sourcecode.mkdir('services')
+    services.join('api.py').write('import six.moves\n')
+    tmpdir.join('legacy.txt').write('six<=2\n')
+    tmpdir.join('services.txt').write('six==0\nsix.moves==0\n')
+
+    runner = CliRunner()
+    args = ['--scoped-constraints', str(legacy), 'legacy.txt',
+            '--scoped-constraints', str(services), 'services.txt',
+            str(sourcecode)]
+    with tmpdir.as_cwd():
+        result = runner.invoke(important.__main__.check, ['-v'] + args)
+    assert result.exit_code == 1
+    assert result.output.splitlines() == [
+        'Parsed 4 imports in 3 files',
+        'Error: Unused requirements or violated constraints found',
+        'six==0 (constraint violated by six==1 within services)',
+        'six.moves==0 (constraint violated by six.moves==1 within services)',
+    ]
+
+    with tmpdir.as_cwd():
+        result = runner.invoke(important.__main__.check, [
+            '--scoped-constraints', str(tmpdir), 'legacy.txt',
+            str(sourcecode)])
+    assert result.exit_code == 2
+    assert 'is not within SOURCECODE' in result.output
+
+
+def test_main_fail_fast(tmpdir):
+    sourcecode = tmpdir.mkdir('sourcecode')
+    sourcecode.join('tool.py').write('import six\nimport os\n')
+    subdir = sourcecode.mkdir('subdir')
+    for index in range(3):
+        subdir.join('module%d.py' % index).write('import six\n')
+    tmpdir.join('requirements.txt').write('six\n')
+    tmpdir.join('constraints.txt').write('six==0\nos>1\n')
+
+    runner = CliRunner()
+    with tmpdir.as_cwd():
+        result = runner.invoke(important.__main__.check, [
+            '-v', '--fail-fast', '--requirements', 'requirements.txt',
+            str(sourcecode)])
+    assert result.exit_code == 0, result.output
+    assert result.output.splitlines() == [
+        'Parsed 1 imports in 1 files',
+        'Stopped once the outcome was decided, skipping 0 files found but '
+        'not parsed and 1 directories not walked',
+    ]
+
+    # Only the constraints found to be violated are reported
+    with tmpdir.as_cwd():
+        result = runner.invoke(important.__main__.check, [
+            '-v', '--early-exit', '--constraints', 'constraints.txt',
+            str(sourcecode)])
+        expected = runner.invoke(important.__main__.check, [
+            '-v', '--constraints', 'constraints.txt', str(sourcecode)])
+    assert result.exit_code == expected.exit_code == 1
+    assert result.output.splitlines()[-1] == \
+        'six==0 (constraint violated by six==1)'
+    assert expected.output.splitlines()[-2:] == [
+        'os>1 (constraint violated by os==1)',
+        'six==0 (constraint violated by six==4)',
+    ]
+
+
+def test_main_targeted(tmpdir):
+    sourcecode = tmpdir.mkdir('sourcecode')
+    sourcecode.join('tool.py').write('import six\nimport os\n')
+    sourcecode.join('other.py').write('import os\nimport sys\n')
+    tmpdir.join('requirements.txt').write('six\nunused\n')
+
+    runner = CliRunner()
+    with tmpdir.as_cwd():
+        result = runner.invoke(important.__main__.check, [
+            '-vv', '--targeted', '--requirements', 'requirements.txt',
+            str(sourcecode)])
+    assert result.exit_code == 1
+    lines = result.output.splitlines()
+    assert 'Parsed 2 imports in 1 files' in lines
+    assert 'Skipped 1 files not naming any module checked' in lines
+    assert lines[-1] == 'unused (unused requirement)'
+
+
+def test_main_archive(requirements_file, tmpdir):
+    archive = str(tmpdir.join('package-1.0-py3-none-any.whl'))
+    with zipfile.ZipFile(archive, 'w') as archive_file:
+        archive_file.writestr('package/__init__.py', 'import os\n')
+    runner = CliRunner()
+    with tmpdir.as_cwd():
+        result = runner.invoke(important.__main__.check, [
+            '-vvv', '--constraints', requirements_file, archive])
+    assert result.exit_code == 0
+    assert 'os=package/__init__.py:1' in result.output.splitlines()
+
+    invalid_archive = tmpdir.join('invalid.tar.gz')
+    invalid_archive.write('not an archive')
+    with tmpdir.as_cwd():
+        result = runner.invoke(important.__main__.check, [
+            '--constraints', requirements_file, str(invalid_archive)])
+    assert result.exit_code == 2
+    assert 'Cannot read' in result.output
+
+
+def test_main_since(requirements_file_one_unused, python_source_dir, tmpdir):
+    def git(*args):
+        subprocess.check_call(
+            ('git', '-c', 'user.name=important', '-c',
+             'user.email=important@example.com') + args,
+            cwd=python_source_dir, stdout=subprocess.PIPE)
+    try:
+        git('init', '-q')
+    except OSError:
+        pytest.skip('git is not installed')
+    git('add', '.')
+    git('commit', '-q', '-m', 'Initial commit')
+
+    runner = CliRunner()
+    args = ['--requirements', requirements_file_one_unused, '-vv',
+            python_source_dir]
+    with tmpdir.as_cwd():
+        expected = runner.invoke(important.__main__.check, args)
+        outputs = [runner.invoke(important.__main__.check,
+                                 ['--since', 'HEAD'] + args).output
+                   for _ in range(2)]
+        result = runner.invoke(important.__main__.check,
+                               ['--since', 'not-a-ref'] + args)
+    assert outputs[0] == outputs[1].replace('Reused imports of 3 ',
+                                            'Reused imports of 0 ')
+    assert outputs[0].replace(
+        'Reused imports of 0 files unchanged since the baseline\n', '') == \
+        expected.output
+    assert result.exit_code == 2
+    assert 'not-a-ref is not a commit' in result.output
+
+
+def test_main_git_files(tmpdir):
+    repository = tmpdir.mkdir('repository')
+    repository.join('a.py').write('import six\n')
+    repository.join('.gitignore').write('venv/\n')
+    try:
+        subprocess.check_call(['git', 'init', '-q'], cwd=str(repository))
+    except OSError:
+        pytest.skip('git is not installed')
+    subprocess.check_call(['git', 'add', '.'], cwd=str(repository))
+    repository.join('b.py').write('import click\n')
+    repository.mkdir('venv').join('c.py').write('import yaml\n')
+    tmpdir.join('requirements.txt').write('six\nclick\n')
+
+    runner = CliRunner()
+    args = ['-v', '--requirements', 'requirements.txt', str(repository)]
+    with tmpdir.as_cwd():
+        tracked = runner.invoke(important.__main__.check,
+                                ['--git-files'] + args)
+        untracked = runner.invoke(important.__main__.check,
+                                  ['--git-files', '--git-untracked'] + args)
+        walked = runner.invoke(important.__main__.check, args)
+        invalid = runner.invoke(important.__main__.check, [
+            '--git-files', '--requirements', 'requirements.txt',
+            str(tmpdir.mkdir('not-a-repository'))])
+    assert tracked.exit_code == 1
+    assert tracked.output.splitlines() == [
+        'Parsed 1 imports in 1 files',
+        'Error: Unused requirements or violated constraints found',
+        'click (unused requirement)',
+    ]
+    assert untracked.exit_code == 0, untracked.output
+    assert untracked.output == 'Parsed 2 imports in 2 files\n'
+    assert walked.output == 'Parsed 3 imports in 3 files\n'
+    assert invalid.exit_code == 2
+
+
+def test_main_watch(requirements_file_one_unused, python_source_dir, tmpdir,
+                    mocker):
+    def changes(directory, exclusions, filepaths):
+        assert filepaths == set([requirements_file_one_unused])
+        unused_file = os.path.join(directory, 'unused.py')
+        with open(unused_file, 'w') as fh:
+            fh.write('import unused\n')
+        yield set([unused_file])
+        yield set([os.path.join(directory, 'unchanged.txt')])
+        with open(requirements_file_one_unused, 'a') as fh:
+            fh.write('\nalso_unused\n')
+        yield set([requirements_file_one_unused])
+    mocker.patch('important.__main__.watch_changes', side_effect=changes)
+
+    runner = CliRunner()
+    with tmpdir.as_cwd():
+        result = runner.invoke(important.__main__.check, [
+            '--requirements', requirements_file_one_unused, '--watch',
+            python_source_dir])
+    assert result.exit_code == 0, result.output
+    assert result.output == '''
+Unused requirements or violated constraints found
+unused (unused requirement)
+No unused requirements or violated constraints found
+Unused requirements or violated constraints found
+also-unused (unused requirement)
+'''.lstrip()
+
+
+def test_main_unwritable_cache_dir(requirements_file_one_unused,
+                                   python_source_dir, tmpdir):
+    # Checks run without caching where the cache cannot be written
+    tmpdir.join('file').write('')
+    readonly = tmpdir.mkdir('readonly')
+    readonly.chmod(0o555)
+    runner = CliRunner()
+    args = ['--requirements', requirements_file_one_unused, '-v',
+            python_source_dir]
+    with tmpdir.as_cwd():
+        expected = runner.invoke(important.__main__.check, args)
+        for cache_dir in (tmpdir.join('file', 'cache'), readonly):
+            result = runner.invoke(important.__main__.check, [
+                '--cache-dir', str(cache_dir)] + args)
+            assert result.exception is None or \
+                isinstance(result.exception, SystemExit), result.output
+            assert result.exit_code == expected.exit_code == 1
+            assert result.output == expected.output
+
+
+def test_main_without_daemons(requirements_file, python_source_dir, tmpdir,
+                              monkeypatch):
+    # Platforms without user IDs (e.g. Windows) check in-process
+    monkeypatch.delattr(os, 'getuid')
+    runner = CliRunner()
+    with tmpdir.as_cwd():
+        result = runner.invoke(important.__main__.check, [
+            '--requirements', requirements_file, python_source_dir])
+        daemon = runner.invoke(important.__main__.check, [
+            '--daemon', python_source_dir])
+    assert result.exit_code == 0, result.output
+    assert daemon.exit_code == 2
+    assert 'daemons are not supported on this platform' in daemon.output
+
+
+def test_main_daemon(requirements_file_one_unused, python_source_dir,
+                     tmpdir):
+    # Make our own temp dir because tmpdir's are too long to be unix sockets
+    tempdir = tempfile.mkdtemp()
+    socket_file = os.path.join(tempdir, 's')
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(
+        os.path.dirname(important.__main__.__file__)))
+    daemon = subprocess.Popen(
+        [sys.executable, '-m', 'important', '--daemon', '--socket',
+         socket_file, python_source_dir],
+        cwd=str(tmpdir), env=env, stdout=subprocess.PIPE)
+    try:
+        assert daemon.stdout.readline().decode('utf8').strip() == \
+            'Listening on %s' % socket_file
+
+        runner = CliRunner()
+        args = ['--requirements', requirements_file_one_unused, '-vv',
+                python_source_dir]
+        with tmpdir.as_cwd():
+            for exit_code in (1, 0):
+                expected = runner.invoke(
+                    important.__main__.check,
+                    ['--socket', os.path.join(tempdir, 'none')] + args)
+                result = runner.invoke(important.__main__.check,
+                                       ['--socket', socket_file] + args)
+                assert result.exit_code == expected.exit_code == exit_code
+                assert result.output == expected.output
+
+                # The daemon parses files again once they change
+                with open(os.path.join(python_source_dir, 'unused.py'),
+                          'w') as fh:
+                    fh.write('import unused\n')
+
+        # Clients of other Python environments check in-process
+        response = query(socket_file, {'version': important.__version__,
+                                       'prefix': tmpdir.strpath})
+        assert response == {'error': 'important is running in %s' %
+                            sys.prefix}
+    finally:
+        daemon.terminate()
+        daemon.wait()
+        assert not os.path.exists(socket_file)
+        os.rmdir(tempdir)
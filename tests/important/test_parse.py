@@ -5,13 +5,20 @@
 from __future__ import unicode_literals
 
 import codecs
+import important.parse
 import os
 import pytest
 import stat
+import subprocess
+import sys
 
-from important.parse import _imports, parse_file_imports, parse_dir_imports, \
-    parse_requirements, Import, RE_SHEBANG, _is_script, \
-    translate_req_to_module_names
+from collections import Counter
+
+from important.parse import _imports, _fast_imports, parse_file_imports, \
+    parse_dir_imports, parse_files_imports, parse_requirements, Import, \
+    RE_SHEBANG, _is_script, translate_req_to_module_names, is_excluded, \
+    Exclusions, distribution_module_index, module_prefilter, \
+    refresh_distribution_module_index
 
 try:
     from unittest.mock import Mock
@@ -24,12 +31,104 @@ def test_imports(python_source, python_imports, encoding):
         python_imports
 
 
+def test_imports_nested_statements():
+    source = '''
+try:
+    import a
+except ImportError:
+    import b
+else:
+    import c
+finally:
+    import d
+for _ in range(1):
+    if False:
+        class A(object):
+            def f(self):
+                import e
+    else:
+        import f
+while False:
+    pass
+else:
+    with open('file') as fh:
+        from g import h
+'''.strip()
+    assert [i[0] for i in _imports(source, 'filename.py')] == \
+        ['a', 'b', 'c', 'd', 'e', 'f', 'g']
+
+
+def test_imports_deeply_nested_expression():
+    # Expressions nested deeper than the recursion limit are never walked
+    source = 'import os\nx = ' + ' + '.join(['1'] * 2000)
+    assert list(_imports(source, 'filename.py')) == [('os', 1, 0)]
+
+
+def test_fast_imports(python_source, python_imports):
+    assert _fast_imports(python_source, 'filename.py') == python_imports
+
+
+@pytest.mark.parametrize('source', (
+    'import a.b as c, d\nfrom e.f import (g,\n    h as i)',
+    'from . import a\nfrom .. b import c\nfrom ...d.e import *',
+    'if True: import a; from b import c\nelse: import d',
+    'x = {"a": 1}; import a\ny = lambda: 1\nimport \\\n    b',
+    'def f():\n    raise ValueError() from None\n    yield from g()',
+    's = "uʍop ǝpısdn"; import a',
+))
+def test_fast_imports_match_ast(source):
+    assert _fast_imports(source, 'filename.py') == \
+        list(_imports(source, 'filename.py'))
+
+
+def test_fast_imports_fallback(mocker):
+    ast_imports = mocker.patch('important.parse._imports',
+                               Mock(side_effect=_imports))
+    # A continuation line beginning with `from` is not an import statement,
+    # so the source is handed to ast instead
+    source = 'def f():\n    x = (yield\n         from g())\n    import a'
+    assert _fast_imports(source, 'filename.py') == [('a', 4, 4)]
+    ast_imports.assert_called_once_with(source, 'filename.py')
+
+
 def test_file_imports(python_source_file, python_imports):
     assert list(parse_file_imports(python_source_file)) == \
         list(map(lambda i: Import(i[0], 'test.py', i[1], i[2]),
                  python_imports))
 
 
+def test_file_imports_fast_parser(python_source_file):
+    assert list(parse_file_imports(python_source_file, parser='fast')) == \
+        list(parse_file_imports(python_source_file))
+
+
+@pytest.mark.parametrize('parser', ('ast', 'fast'))
+@pytest.mark.parametrize('source,lineno', (
+    (b'# -*- coding: latin-1 -*-\nimport os\nname = "\xe9"\n', 2),
+    (b'#!/usr/bin/env python\n# vim: set fileencoding=cp1252 :\n'
+     b'import os\nname = "\x80"\n', 3),
+    (b'\xef\xbb\xbfimport os\nname = "\xc3\xa9"\n', 1),
+    # Files declaring unknown encodings are skipped
+    (b'# -*- coding: unknown -*-\nimport os\n', None),
+    (b'import os  # \xff\n', 1),
+))
+def test_file_imports_encodings(tmpdir, parser, source, lineno):
+    # Files are decoded as declared (or given a BOM) rather than as UTF-8
+    python_source_file = tmpdir.join('encoded.py')
+    python_source_file.write_binary(source)
+    assert list(parse_file_imports(str(python_source_file),
+                                   parser=parser)) == \
+        ([Import('os', 'encoded.py', lineno, 0)] if lineno else [])
+
+
+def test_file_imports_mmap(mocker, python_source_file):
+    mocker.patch('important.parse.MMAP_THRESHOLD', 1)
+    mmap = mocker.spy(important.parse.mmap, 'mmap')
+    assert list(parse_file_imports(python_source_file)) == \
+        list(parse_file_imports(python_source_file, parser='fast'))
+    assert mmap.call_count == 2
+
+
 def test_file_imports_with_syntax_error(mocker, python_source_file):
     logger = Mock()
     mocker.patch('important.parse.LOGGER', logger)
@@ -71,6 +170,10 @@ def test_file_imports_binary_file(mocker, binary_file, encoding):
     logger = Mock()
     mocker.patch('important.parse.LOGGER', logger)
 
+    # Include the import keyword so that the file is not skipped unparsed
+    with open(binary_file, 'ab') as fh:
+        fh.write(b' import')
+
     # Attempt to parse and assert that it logged a warning
     list(parse_file_imports(binary_file))
     logger.warning.assert_called_with(
@@ -80,19 +183,60 @@ def test_file_imports_binary_file(mocker, binary_file, encoding):
     )
 
 
-def test_is_script_binary_file(mocker, binary_file, encoding):
+def test_file_imports_without_import_keyword(mocker, tmpdir, binary_file):
+    logger = Mock()
+    mocker.patch('important.parse.LOGGER', logger)
+    statistics = mocker.patch('important.parse.STATISTICS', Counter())
+
+    python_source_file = tmpdir.join('constants.py')
+    python_source_file.write('IMPORTANT = True\nFROM = "from"\n')
+
+    # Files without the import keyword are skipped without being decoded
+    assert list(parse_file_imports(str(python_source_file))) == []
+    assert list(parse_file_imports(binary_file)) == []
+    logger.warning.assert_not_called()
+    assert statistics['skipped_no_imports'] == 2
+
+
+def test_dir_imports_statistics(mocker, python_source_dir, exclusions):
+    statistics = mocker.patch('important.parse.STATISTICS', Counter())
+    slowest_files = mocker.patch('important.parse.SLOWEST_FILES', [])
+    mocker.patch('important.parse.SLOWEST_FILES_KEPT', 2)
+    with open(os.path.join(python_source_dir, 'invalid.py'), 'w') as fh:
+        fh.write('import (\n')
+    list(parse_dir_imports(python_source_dir, exclusions))
+    assert statistics['files_read'] == 4
+    assert statistics['bytes_read'] > 0
+    assert statistics['excluded'] == 2
+    assert statistics['skipped_syntax_error'] == 1
+    assert statistics['seconds_parse'] > 0
+    assert len(slowest_files) == 2
+
+
+def test_is_script_binary_file(mocker, binary_file):
     logger = Mock()
     mocker.patch('important.parse.LOGGER', logger)
 
     # Make the file executable to appear to be a script
     os.chmod(binary_file, stat.S_IXUSR | stat.S_IRUSR)
-    # Attempt to parse and assert that it logged a warning
-    _is_script(binary_file)
-    logger.warning.assert_called_with(
-        'Skipping %s due to decode error: %s', binary_file,
-        "'{encoding}' codec can't decode byte 0xff in position 0:\
- invalid start byte".format(encoding=encoding)
-    )
+    # Assert that it was rejected from its prefix without a warning
+    assert not _is_script(binary_file)
+    logger.warning.assert_not_called()
+
+
+def test_is_script(tmpdir):
+    script_file = tmpdir.join('script')
+    script_file.write_binary(b'#!/usr/bin/env python\r\nimport os\r\n')
+    assert not _is_script(str(script_file))
+
+    # Only executable files are scripts
+    script_file.chmod(stat.S_IXUSR | stat.S_IRUSR)
+    assert _is_script(str(script_file))
+    assert _is_script(str(script_file), os.stat(str(script_file)))
+
+    # Shebangs must be on the first line
+    script_file.write_binary(b'\n#!/usr/bin/env python\nimport os\n')
+    assert not _is_script(str(script_file))
 
 
 def test_dir_imports(python_source_dir, python_file_imports, exclusions):
@@ -100,10 +244,112 @@ def test_dir_imports(python_source_dir, python_file_imports, exclusions):
         set(python_file_imports)
 
 
+def test_dir_imports_parallel(mocker, python_source_dir, exclusions):
+    serial_imports = list(parse_dir_imports(python_source_dir, exclusions))
+
+    # Force even this small directory to be parsed by a pool of processes
+    mocker.patch('important.parse.PARALLEL_THRESHOLD', 1)
+    assert list(parse_dir_imports(python_source_dir, exclusions, jobs=2)) == \
+        serial_imports
+
+
+def test_dir_imports_read_ahead(mocker, python_source_dir, exclusions):
+    serial_imports = list(parse_dir_imports(python_source_dir, exclusions))
+
+    # Executable files without a Python shebang are rejected once read
+    mocker.patch('important.parse.READ_AHEAD', 1)
+    assert list(parse_dir_imports(python_source_dir, exclusions,
+                                  read_threads=2)) == serial_imports
+
+    os.remove(os.path.join(python_source_dir, 'test1.py'))
+    with pytest.raises(IOError):
+        list(parse_files_imports(
+            [os.path.join(python_source_dir, 'test1.py')], python_source_dir,
+            read_threads=2))
+
+
+def test_module_prefilter():
+    prefilter = module_prefilter(['yaml', 'matplotlib.pyplot', 'markdown',
+                                  'ma'])
+    assert prefilter.search(b'import yaml')
+    assert prefilter.search(b'from matplotlib import pyplot')
+    assert prefilter.search(b'import markdown.extensions')
+    assert prefilter.search(b'import ma as m')
+    # Names are matched as whole words
+    assert not prefilter.search(b'import mayaml, pyyaml, matplot, marker')
+    assert not module_prefilter([]).search(b'import yaml')
+
+
+@pytest.mark.parametrize('jobs', (1, 2))
+def test_dir_imports_prefilter(mocker, python_source_dir, exclusions,
+                               import_name, jobs):
+    statistics = mocker.patch('important.parse.STATISTICS', Counter())
+    mocker.patch('important.parse.PARALLEL_THRESHOLD', 1)
+    imports = list(parse_dir_imports(python_source_dir, exclusions))
+    with open(os.path.join(python_source_dir, 'other.py'), 'w') as fh:
+        fh.write('import os\n')
+    # Only files naming a module searched for are parsed
+    assert list(parse_dir_imports(
+        python_source_dir, exclusions, jobs=jobs,
+        prefilter=module_prefilter([import_name]))) == imports
+    assert statistics['skipped_prefilter'] == 1
+
+
 def test_excluded_directory_imports(python_excluded_dir, exclusions):
     assert set(parse_dir_imports(python_excluded_dir, exclusions)) == set()
 
 
+def test_dir_imports_glob_exclusions(python_source_dir, python_file_imports,
+                                     exclusions):
+    assert set(parse_dir_imports(
+        python_source_dir, exclusions + ['**/test3.py', 'test?.py'])) == \
+        set(i for i in python_file_imports if i.filename == 'scriptfile')
+
+
+def test_dir_imports_prunes_excluded_directories(mocker, python_source_dir,
+                                                 python_excluded_dir):
+    scandir = mocker.patch('important.parse.scandir',
+                           Mock(side_effect=important.parse.scandir))
+    for exclusion in (python_excluded_dir, '**/excluded'):
+        scandir.reset_mock()
+        list(parse_dir_imports(python_source_dir, [exclusion]))
+        scanned = [call[0][0] for call in scandir.call_args_list]
+        assert python_excluded_dir not in scanned
+        assert os.path.join(python_source_dir, 'subdir') in scanned
+
+
+def test_is_excluded(python_source_dir, python_excluded_dir):
+    filepath = os.path.join(python_excluded_dir, 'test4.py')
+    assert is_excluded(filepath, [python_excluded_dir])
+    assert is_excluded(filepath, Exclusions([python_excluded_dir]))
+    assert is_excluded(filepath, ['**/excluded'], python_source_dir)
+    assert is_excluded(filepath, ['**/*.py'], python_source_dir)
+    assert is_excluded(filepath, ['excluded/test[0-9].py'], python_source_dir)
+    assert is_excluded(filepath, [os.path.join(python_source_dir, '*')])
+    assert not is_excluded(filepath, None)
+    assert not is_excluded(filepath, ['test4.py'], python_source_dir)
+    assert not is_excluded(filepath, ['*.py'], python_source_dir)
+    assert not is_excluded(filepath, ['excluded/test[!4].py'],
+                           python_source_dir)
+    # Relative globs only match within the directory being parsed
+    assert not is_excluded(filepath, ['**/excluded'])
+
+
+def test_exclusions_excludes_relative(python_source_dir,
+                                      python_excluded_dir):
+    path = 'excluded/test4.py'
+    assert Exclusions([python_excluded_dir]).excludes_relative(
+        python_source_dir, path)
+    assert Exclusions(['**/excluded']).excludes_relative(
+        python_source_dir, path)
+    assert Exclusions(['excluded/*.py']).excludes_relative(
+        python_source_dir, path)
+    assert not Exclusions(['test4.py']).excludes_relative(
+        python_source_dir, path)
+    assert not Exclusions(['**/subdir']).excludes_relative(
+        python_source_dir, path)
+
+
 def test_re_shebang():
     assert RE_SHEBANG.match('#!/usr/bin/env python')
     assert RE_SHEBANG.match('#!/usr/bin/env python2')
@@ -153,6 +399,79 @@ def test_requirements_editable(tmpdir):
         'Cannot parse SomeDependency: editable projects unsupported'
 
 
+def test_requirements_options(tmpdir):
+    requirements_file = tmpdir.join('requirements.txt')
+    requirements_file.write('''
+--index-url https://pypi.example.com/simple
+# Generated by pip-compile
+click==6.7 \\
+    --hash=sha256:29f99fc6125fbc931b758dc053b3114e \\
+    --hash=sha256:f15516df478d5a56180fbf80e68f2060
+    # via important
+requests[security,socks]>=2.0  # comment
+enum34; python_version < "3.4"
+Other_Unused>=1,<2
+    '''.strip())
+    requirements = list(parse_requirements(str(requirements_file)))
+    assert [(r.name, str(r.specifier), r.extras, r.lineno)
+            for r in requirements] == [
+        ('click', '==6.7', (), 3),
+        ('requests', '>=2.0', ('security', 'socks'), 7),
+        ('enum34', '', (), 8),
+        ('Other-Unused', '<2,>=1', (), 9),
+    ]
+    assert str(requirements[2].marker) == 'python_version < "3.4"'
+
+
+def test_requirements_invalid(tmpdir):
+    requirements_file = tmpdir.join('requirements.txt')
+    requirements_file.write('pkg1\npkg2[extra')
+    with pytest.raises(ValueError) as excinfo:
+        list(parse_requirements(str(requirements_file)))
+    assert str(excinfo.value) == \
+        "Invalid requirement 'pkg2[extra' (%s, line 2)" % requirements_file
+
+
+def test_requirements_includes(tmpdir, mocker):
+    tmpdir.mkdir('requirements')
+    tmpdir.join('requirements', 'base.txt').write('pkg1\n-c constraints.txt')
+    tmpdir.join('requirements', 'constraints.txt').write('pkg1<2')
+    tmpdir.join('requirements.txt').write(
+        '-r requirements/base.txt\npkg2\n--requirement=requirements/base.txt')
+    tmpdir.join('requirements-dev.txt').write('-rrequirements/base.txt\npkg3')
+    stream = mocker.patch(
+        'important.parse._stream_requirements_file',
+        side_effect=important.parse._stream_requirements_file)
+    mocker.patch('important.parse._REQUIREMENTS_FILES', {})
+
+    assert [(r.name, str(r.specifier), r.constraint) for r in
+            parse_requirements(str(tmpdir.join('requirements.txt')))] == [
+        ('pkg1', '', False),
+        ('pkg1', '<2', True),
+        ('pkg2', '', False),
+        ('pkg1', '', False),
+        ('pkg1', '<2', True),
+    ]
+    assert [r.name for r in
+            parse_requirements(str(tmpdir.join('requirements-dev.txt')))] == \
+        ['pkg1', 'pkg1', 'pkg3']
+    # Each file is parsed once no matter how many times it is included
+    assert sorted(os.path.basename(call[0][0])
+                  for call in stream.call_args_list) == \
+        ['base.txt', 'constraints.txt', 'requirements-dev.txt',
+         'requirements.txt']
+
+
+def test_requirements_include_themselves(tmpdir):
+    requirements_file = tmpdir.join('requirements.txt')
+    tmpdir.join('base.txt').write('pkg1\n-r requirements.txt')
+    requirements_file.write('-r base.txt')
+    with pytest.raises(ValueError) as excinfo:
+        list(parse_requirements(str(requirements_file)))
+    assert str(excinfo.value) == 'Cannot parse %s: it includes itself' % \
+        os.path.realpath(str(requirements_file))
+
+
 def test_translate_req_to_module_names(mocker):
     logger = Mock()
     mocker.patch('important.parse.LOGGER', logger)
@@ -184,3 +503,97 @@ resolution", 'not_a_real_package')
     logger.reset_mock()
     assert translate_req_to_module_names('os.path') == set(['os.path'])
     logger.warning.assert_not_called()
+
+
+def test_distribution_module_index(mocker):
+    def distribution(project_name, metadata):
+        distribution = Mock(project_name=project_name,
+                            location='/site-packages',
+                            egg_info='/site-packages/%s.egg-info' %
+                            project_name)
+        distribution.has_metadata.side_effect = \
+            lambda name: name in metadata
+        distribution.get_metadata_lines.side_effect = \
+            lambda name: iter(metadata[name].split())
+        return distribution
+
+    mocker.patch('important.parse._DISTRIBUTION_MODULE_INDEX', None)
+    mocker.patch('important.parse._DISTRIBUTION_PATHS_STAMP', None)
+    mocker.patch('pkg_resources.working_set', [
+        distribution('matplotlib', {
+            'top_level.txt': 'matplotlib mpl_toolkits pylab',
+            'RECORD': 'matplotlib/__init__.py,,',
+        }),
+        distribution('dnspython', {
+            'RECORD': """
+                dns/__init__.py,sha256=x,1
+                dns/rdtypes/ANY/__init__.py,sha256=x,1
+                dnspython-1.0.dist-info/RECORD,,
+                dnspython.libs/libdns.so,,
+                __pycache__/something.pyc,,
+                ../../bin/dns,,
+            """,
+        }),
+        distribution('IPy', {
+            'installed-files.txt': '../IPy.py ../IPy.pyc ./PKG-INFO',
+        }),
+        distribution('python_C-ext', {
+            'RECORD': '_ext.cpython-36m-x86_64-linux-gnu.so,,',
+        }),
+        distribution('wsgiref', {}),
+    ])
+    assert distribution_module_index() == {
+        'matplotlib': set(['matplotlib', 'mpl_toolkits', 'pylab']),
+        'dnspython': set(['dns']),
+        'ipy': set(['IPy']),
+        'python-c-ext': set(['_ext']),
+        'wsgiref': set(),
+    }
+    # The index is built only once
+    assert distribution_module_index() is distribution_module_index()
+    assert translate_req_to_module_names('Python.C_ext') == set(['_ext'])
+
+
+def test_refresh_distribution_module_index(mocker):
+    mocker.patch('important.parse._DISTRIBUTION_MODULE_INDEX',
+                 {'six': set(['six'])})
+    mocker.patch('important.parse._DISTRIBUTION_PATHS_STAMP', [1.0])
+    mocker.patch('important.parse._ALL_MODULES', set(['six']))
+    stamp = mocker.patch('important.parse._distribution_paths_stamp',
+                         return_value=[1.0])
+    working_set = mocker.patch('pkg_resources.WorkingSet', return_value=[])
+    assert not refresh_distribution_module_index()
+    assert distribution_module_index() == {'six': set(['six'])}
+
+    # Distributions are scanned again once installed or uninstalled
+    stamp.return_value = [2.0]
+    assert refresh_distribution_module_index()
+    assert distribution_module_index() == {}
+    assert important.parse._ALL_MODULES is None
+    working_set.assert_called_once_with()
+
+
+def test_is_importable_module(mocker):
+    iter_modules = mocker.patch('important.parse.pkgutil.iter_modules',
+                                return_value=[(None, 'installed', False)])
+    mocker.patch('important.parse._ALL_MODULES', None)
+    mocker.patch('important.parse.STDLIB_MODULES', frozenset(['os']))
+
+    # Standard library modules are known without searching sys.path
+    assert important.parse._is_importable_module('os')
+    iter_modules.assert_not_called()
+
+    assert important.parse._is_importable_module('installed')
+    assert not important.parse._is_importable_module('not_installed')
+    assert iter_modules.call_count == 1
+
+
+def test_import_is_lazy():
+    # Neither pip nor pkg_resources are imported until they are needed
+    output = subprocess.check_output([
+        sys.executable, '-c',
+        'import sys, important.__main__; '
+        'print(sorted(m for m in ("pip", "pkg_resources") '
+        'if m in sys.modules))'
+    ])
+    assert output.strip() == b'[]'
@@ -0,0 +1,62 @@
+# Copyright (c) 2016-2017 Chris Fournier. All rights reserved.
+# Use of this source code is governed by a MIT-style license that can be found
+# in the LICENSE file.
+from __future__ import unicode_literals
+
+import os
+import pytest
+
+from important.parse import parse_files_imports, Exclusions
+from important.projects import attribute_imports, discover_projects
+
+
+@pytest.fixture
+def monorepo(tmpdir):
+    monorepo = tmpdir.mkdir('monorepo')
+    monorepo.join('setup.cfg').write('[important]\nrequirements=root.txt\n')
+    monorepo.join('tool.py').write('import os\n')
+    api = monorepo.mkdir('api')
+    api.join('setup.cfg').write(
+        '[important]\nrequirements=\n    requirements.txt\nignore=six\n'
+        'sourcecode=src\nexclude=**/test_*.py\n')
+    api.mkdir('src').join('api.py').write('import click\n')
+    api.join('src', 'test_api.py').write('import pytest\n')
+    api.join('outside.py').write('import json\n')
+    web = monorepo.mkdir('web')
+    web.join('setup.cfg').write('[metadata]\nname=web\n')
+    web.join('web.py').write('import sys\n')
+    excluded = monorepo.mkdir('excluded')
+    excluded.join('setup.cfg').write('[important]\nrequirements=r.txt\n')
+    return monorepo
+
+
+def test_discover_projects(monorepo):
+    projects, filepaths = discover_projects(
+        str(monorepo), Exclusions([str(monorepo.join('excluded'))]))
+    assert [project.name for project in projects] == ['.', 'api']
+    api = projects[1]
+    assert api.directory == str(monorepo.join('api'))
+    assert api.sourcecode == str(monorepo.join('api', 'src'))
+    assert api.requirements == [str(monorepo.join('api', 'requirements.txt'))]
+    assert api.ignore == ['six']
+    assert api.constraints == []
+    assert sorted(os.path.relpath(filepath, str(monorepo))
+                  for filepath in filepaths) == [
+        os.path.join('api', 'outside.py'),
+        os.path.join('api', 'src', 'api.py'),
+        os.path.join('api', 'src', 'test_api.py'),
+        'tool.py',
+        os.path.join('web', 'web.py'),
+    ]
+
+
+def test_attribute_imports(monorepo):
+    projects, filepaths = discover_projects(str(monorepo), Exclusions())
+    attributed = sorted(
+        (project.name, import_statement.module)
+        for project, import_statement in attribute_imports(
+            parse_files_imports(filepaths, str(monorepo)), str(monorepo),
+            projects))
+    # Files belong to the innermost project, if within its source code and
+    # not excluded by it
+    assert attributed == [('.', 'os'), ('.', 'sys'), ('api', 'click')]
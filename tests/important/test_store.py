@@ -0,0 +1,40 @@
+# Copyright (c) 2016-2017 Chris Fournier. All rights reserved.
+# Use of this source code is governed by a MIT-style license that can be found
+# in the LICENSE file.
+from __future__ import unicode_literals
+
+from important.parse import Import, parse_dir_imports
+from important.store import ImportStore
+
+
+def test_import_store(python_source_dir):
+    imports = list(parse_dir_imports(python_source_dir))
+    store = ImportStore(imports)
+    assert len(store) == len(imports)
+    assert list(store) == imports
+    assert len(store.modules) == len(set(statement.module
+                                         for statement in imports))
+    assert len(store.filenames) == len(set(statement.filename
+                                           for statement in imports))
+
+
+def test_import_store_remove():
+    store = ImportStore([
+        Import('os', 'a.py', 1, 0),
+        Import('sys', 'b.py', 1, 0),
+        Import(None, 'c.py', 1, 0),
+        Import('os', 'b.py', 2, 4),
+        Import('json', 'a.py', 2, 0),
+    ])
+    assert store.remove(['a.py', 'd.py']) == 2
+    assert list(store) == [
+        Import('sys', 'b.py', 1, 0),
+        Import(None, 'c.py', 1, 0),
+        Import('os', 'b.py', 2, 4),
+    ]
+    assert store.remove(['a.py']) == 0
+
+    # Files removed can be added again
+    store.append(Import('abc', 'a.py', 3, 0))
+    assert list(store)[-1] == Import('abc', 'a.py', 3, 0)
+    assert len(store.filenames) == 3
@@ -0,0 +1,62 @@
+# Copyright (c) 2016-2017 Chris Fournier. All rights reserved.
+# Use of this source code is governed by a MIT-style license that can be found
+# in the LICENSE file.
+from __future__ import unicode_literals
+
+import os
+import pytest
+
+from important.watch import InotifyWatcher, PollingWatcher, watch
+
+
+@pytest.fixture(params=('inotify', 'polling'))
+def watcher(request, python_source_dir, exclusions, tmpdir):
+    requirements_file = str(tmpdir.join('requirements.txt'))
+    if request.param == 'inotify':
+        try:
+            watcher = InotifyWatcher(python_source_dir, exclusions,
+                                     [requirements_file])
+        except OSError:
+            pytest.skip('inotify is unavailable')
+    else:
+        watcher = PollingWatcher(python_source_dir, exclusions,
+                                 [requirements_file], interval=0.01)
+    yield watcher
+    watcher.close()
+
+
+def test_watcher(watcher, python_source_dir, tmpdir):
+    test1 = os.path.join(python_source_dir, 'test1.py')
+    with open(test1, 'a') as fh:
+        fh.write('\nimport abc\n')
+    assert test1 in watcher.wait()
+
+    # Files within created directories are watched
+    newdir = os.path.join(python_source_dir, 'newdir')
+    os.mkdir(newdir)
+    test5 = os.path.join(newdir, 'test5.py')
+    with open(test5, 'w') as fh:
+        fh.write('import json\n')
+    changed = watcher.wait()
+    while test5 not in changed and newdir not in changed:
+        changed = watcher.wait()
+    with open(test5, 'a') as fh:
+        fh.write('import abc\n')
+    assert test5 in watcher.wait()
+
+    requirements_file = str(tmpdir.join('requirements.txt'))
+    with open(requirements_file, 'w') as fh:
+        fh.write('abc\n')
+    assert requirements_file in watcher.wait()
+
+    os.remove(test1)
+    assert test1 in watcher.wait()
+
+
+def test_watch(python_source_dir):
+    changes = watch(python_source_dir)
+    test1 = os.path.join(python_source_dir, 'test1.py')
+    with open(test1, 'a') as fh:
+        fh.write('\nimport abc\n')
+    assert test1 in next(changes)
+    changes.close()